@@ -1,6 +1,7 @@
 import inspect
 
 from django.db.models import signals
+from django.db.models.fields import FieldDoesNotExist
 
 
 def register(*configurations):
@@ -53,6 +54,7 @@ def register_smart_link(shortcuts, conf):
         - IncorrectlyConfiguredSmartlinkException
         - AlreadyRegisteredSmartlinkException
     """
+    from smartlinks.conf import smartlinks_conf
     model = conf.resolve_model()
 
     # Sanity configuration checks.
@@ -110,10 +112,61 @@ def register_smart_link(shortcuts, conf):
                 sender=model
             )
 
+        # Saves which do not change any of the fields the index depends on
+        # can skip updating it, that's what the snapshots are for.
+        conf._dependencies = conf.get_index_dependencies()
+        if conf._dependencies is not None:
+            signals.post_init.connect(
+                conf.snapshot_instance,
+                sender=model
+            )
+
     # The global object is updated as well,
     # this line is purely for debugging/testing purposes.
     return smartlinks_conf
 
+def register_link_source(model, fields=None):
+    """
+    Keep the reverse index of the smartlinks in the ``fields`` of the
+    ``model`` up to date, see :py:class:`smartlinks.models.LinkReference`.
+
+    EG::
+
+        class Page(models.Model):
+            body = models.TextField()
+            link = SmartLinkField()
+
+        smartlinks.register_link_source(Page, ('body', 'link'))
+
+    after which :py:func:`smartlinks.references.references_to` finds the pages
+    with smartlinks to an object.
+
+    :param model: Model with smartlinked text.
+    :param fields: Names of the fields containing smartlinks or smartembeds,
+        all the :py:class:`smartlinks.fields.SmartLinkField` fields of the
+        model by default.
+    :throws: IncorrectlyConfiguredSmartlinkException
+    """
+    from smartlinks.fields import SmartLinkField
+    from smartlinks.references import link_sources, update_references
+
+    if fields is None:
+        fields = [field.name for field in model._meta.fields
+                  if isinstance(field, SmartLinkField)]
+    for fieldname in fields:
+        # Not ``get_all_field_names()``, which needs all the models loaded,
+        # and this is usually called from a ``models.py``.
+        try:
+            model._meta.get_field(fieldname)
+        except FieldDoesNotExist:
+            raise IncorrectlyConfiguredSmartlinkException(
+                "Model '%s' does not have field '%s'" % (model, fieldname))
+
+    link_sources[model] = tuple(fields)
+    for signal in [signals.post_save, signals.post_delete]:
+        signal.connect(update_references, sender=model)
+    return link_sources
+
 class AlreadyRegisteredSmartlinkException(Exception):
     pass
 
@@ -0,0 +1,14 @@
+"""
+Benchmarks for the smartlinks library. Each module is runnable with
+``python -m smartlinks.benchmarks.<module>`` and prints its results as JSON,
+so that runs can be compared over time:
+
+- ``memory_index``: memory and latency of the in-memory index.
+- ``resolution``: parsing, resolution and index maintenance on a synthetic
+  corpus (see :py:mod:`smartlinks.benchmarks.corpus`), on SQLite.
+- ``load``: render latency, errors and index consistency under concurrent
+  renders, saves and deletes, on a file-backed SQLite database.
+
+They all configure Django themselves, with the ``smartlinks.benchmarks`` app
+providing the smartlinked models.
+"""
@@ -0,0 +1,146 @@
+"""
+Synthetic corpus for the benchmarks: objects of several smartlinked models
+and documents with smartlinks to them, some resolving, some not resolving
+and some ambiguous, in controlled proportions.
+
+Needs Django to be configured, see :py:func:`smartlinks.benchmarks.database.configure`.
+"""
+import random
+import string
+
+from django.db.models import signals
+
+from smartlinks import register_smart_link
+from smartlinks.conf import SmartLinkConf, smartlinks_conf
+
+
+class Corpus(object):
+    """
+    Generate and register the corpus.
+
+    :param models: Number of the smartlinked models, at most
+        :py:data:`smartlinks.benchmarks.models.MODEL_COUNT`.
+    :param objects: Number of the objects of each model.
+    :param links: Number of the smartlinks in each document.
+    :param hits: Proportion of the smartlinks resolving to an object.
+    :param ambiguous: Proportion of the smartlinks matching several objects,
+        the rest does not resolve.
+    :param typed: Proportion of the smartlinks specifying the model.
+    :param seed: Seed of the random generator, for repeatable corpora.
+    """
+
+    def __init__(self, models=4, objects=1000, links=20, hits=0.8,
+                 ambiguous=0.1, typed=0.5, seed=0):
+        from smartlinks.benchmarks.models import entity_models
+
+        if models > len(entity_models):
+            raise ValueError("At most %s models" % len(entity_models))
+        self.models = entity_models[:models]
+        self.objects = objects
+        self.links = links
+        self.hits = hits
+        self.ambiguous = ambiguous
+        self.typed = typed
+        self.rng = random.Random(seed)
+
+        #: Maps the models to their configurations.
+        self.confs = {}
+
+        #: Maps the models to the titles of their objects.
+        self.titles = {}
+
+        #: Maps the models to the common prefixes of pairs of their objects.
+        self.twins = {}
+
+    def parameters(self):
+        return {
+            'models': len(self.models),
+            'objects': self.objects,
+            'links': self.links,
+            'hits': self.hits,
+            'ambiguous': self.ambiguous,
+            'typed': self.typed,
+        }
+
+    def shortcut(self, model):
+        return model._meta.model_name
+
+    def create(self, signals=False):
+        """
+        Create the objects, register the configurations and build the index.
+
+        :param signals: Whether the configurations are registered with
+            :py:func:`smartlinks.register_smart_link`, keeping the index up
+            to date on saves and deletes, or only added to
+            :py:data:`smartlinks.conf.smartlinks_conf`.
+        :return: Number of the index entries created.
+        """
+        entries = 0
+        for model in self.models:
+            twins = min(max(1, int(self.objects * self.ambiguous / 2)),
+                        self.objects // 2)
+            titles = [self.word(12) for i in range(self.objects - twins * 2)]
+            prefixes = [u"twin%s" % self.word(8) for i in range(twins)]
+            self.titles[model] = titles
+            self.twins[model] = prefixes
+
+            all_titles = titles + [u"%s %s" % (prefix, suffix)
+                                   for prefix in prefixes
+                                   for suffix in (u"one", u"two")]
+            model.objects.bulk_create([
+                model(title=title, slug=title.replace(u" ", u"-"))
+                for title in all_titles
+            ])
+
+            conf = SmartLinkConf(model.objects, searched_fields=('title',))
+            if signals:
+                register_smart_link((self.shortcut(model),), conf)
+            else:
+                smartlinks_conf[self.shortcut(model)] = conf
+            self.confs[model] = conf
+            entries += conf.recreate_index()
+        return entries
+
+    def unregister(self):
+        for model, conf in self.confs.items():
+            smartlinks_conf.pop(self.shortcut(model), None)
+            for signal in (signals.post_save, signals.post_delete):
+                signal.disconnect(conf.update_index_for_object, sender=model)
+            signals.post_init.disconnect(conf.snapshot_instance, sender=model)
+        self.confs = {}
+
+    def word(self, length):
+        return u"".join(self.rng.choice(string.ascii_lowercase)
+                        for i in range(length))
+
+    def smartlink(self, typed=None):
+        """
+        :param typed: Whether the smartlink specifies the model, randomly
+            chosen in the :py:attr:`typed` proportion by default.
+        :return: Random smartlink.
+        """
+        model = self.rng.choice(self.models)
+        kind = self.rng.random()
+        if kind < self.hits:
+            query = self.rng.choice(self.titles[model])
+        elif kind < self.hits + self.ambiguous:
+            query = self.rng.choice(self.twins[model])
+        else:
+            query = u"missing %s" % self.word(10)
+
+        if typed is None:
+            typed = self.rng.random() < self.typed
+        if typed:
+            return u"[[ %s->%s ]]" % (self.shortcut(model), query)
+        return u"[[ %s ]]" % query
+
+    def document(self, typed=None):
+        """
+        :return: Random document with :py:attr:`links` smartlinks.
+        """
+        words = []
+        for i in range(self.links):
+            words.extend(self.word(self.rng.randint(2, 9))
+                         for j in range(self.rng.randint(5, 30)))
+            words.append(self.smartlink(typed))
+        return u" ".join(words)
@@ -0,0 +1,64 @@
+"""
+Standalone Django configuration for the benchmarks, on a file-backed SQLite
+database so that several threads or connections can use it.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+
+
+def configure(path=None, debug=False, timeout=None):
+    """
+    Configure Django, unless it already is, and create the tables.
+
+    :param path: Path of the SQLite database file, a new temporary one by
+        default. An existing file is deleted.
+    :param debug: Whether the queries are recorded.
+    :param timeout: Seconds a connection waits for a lock held by another
+        one, the SQLite default (5) if ``None``.
+    :return: Path of the database file.
+    """
+    if settings.configured:
+        return settings.DATABASES['default']['NAME']
+
+    if path is None:
+        handle, path = tempfile.mkstemp(prefix='smartlinks-benchmark-',
+                                        suffix='.db')
+        os.close(handle)
+    if os.path.exists(path):
+        os.remove(path)
+
+    settings.configure(
+        DEBUG=debug,
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': path,
+                'OPTIONS': {} if timeout is None else {'timeout': timeout},
+            }
+        },
+        INSTALLED_APPS=(
+            'django.contrib.contenttypes',
+            'smartlinks',
+            'smartlinks.benchmarks',
+        ),
+    )
+
+    import django
+    django.setup()
+    create_tables()
+    return path
+
+
+def create_tables():
+    """
+    Create the tables of the installed models directly, bypassing the
+    migrations of the ``smartlinks`` app, which are South ones.
+    """
+    from django.apps import apps
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for model in apps.get_models():
+            editor.create_model(model)
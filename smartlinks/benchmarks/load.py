@@ -0,0 +1,236 @@
+"""
+Concurrent load on a file-backed SQLite database: threads rendering
+documents with the ``smartlinks`` filter while other threads create, edit
+and delete the smartlinked objects, keeping the index up to date through the
+signals::
+
+    python -m smartlinks.benchmarks.load --renderers 16 --writers 4 --duration 30
+
+Reports the render latency percentiles, the numbers of operations and of
+errors by type, and whether the index is consistent with the objects
+afterwards.
+"""
+from optparse import OptionParser
+import json
+import random
+import string
+import threading
+import time
+
+from smartlinks.benchmarks.database import configure
+
+
+def _word(rng, length):
+    return u"".join(rng.choice(string.ascii_lowercase) for i in range(length))
+
+
+def percentile(values, fraction):
+    """
+    :param values: Sorted list.
+    :return: Value below which the ``fraction`` of the ``values`` are.
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Load(object):
+    """
+    Run the renderer and writer threads and collect their outcomes.
+
+    :param corpus: :py:class:`smartlinks.benchmarks.corpus.Corpus` created
+        with the signals.
+    :param documents: Number of the documents rendered, at random.
+    """
+
+    def __init__(self, corpus, documents=100):
+        self.corpus = corpus
+        self.texts = [corpus.document() for i in range(documents)]
+
+        #: Render times in seconds.
+        self.latencies = []
+
+        #: Maps the names of the operations to their numbers.
+        self.operations = {}
+
+        #: Maps the names of the exceptions raised to their numbers.
+        self.errors = {}
+
+        self._lock = threading.Lock()
+
+    def count(self, counts, name):
+        with self._lock:
+            counts[name] = counts.get(name, 0) + 1
+
+    def render(self, rng, deadline):
+        from smartlinks.templatetags.smartlinks import smartlinks
+
+        while time.time() < deadline:
+            text = rng.choice(self.texts)
+            start = time.time()
+            try:
+                smartlinks(text)
+            except Exception as e:
+                self.count(self.errors, type(e).__name__)
+            else:
+                with self._lock:
+                    self.latencies.append(time.time() - start)
+
+    def write(self, rng, deadline):
+        while time.time() < deadline:
+            model = rng.choice(self.corpus.models)
+            action = rng.random()
+            try:
+                if action < 0.3:
+                    title = _word(rng, 12)
+                    model.objects.create(title=title, slug=title)
+                    self.count(self.operations, 'create')
+                    continue
+
+                # Objects are picked by title, so that concurrent writers
+                # pick the same ones.
+                instance = model.objects.filter(
+                    title__gte=_word(rng, 2)).order_by('title').first()
+                if instance is None:
+                    continue
+                if action < 0.8:
+                    instance.title = _word(rng, 12)
+                    instance.save()
+                    self.count(self.operations, 'update')
+                else:
+                    instance.delete()
+                    self.count(self.operations, 'delete')
+            except Exception as e:
+                self.count(self.errors, type(e).__name__)
+
+    def run(self, renderers=8, writers=2, duration=10.0, seed=0):
+        """
+        :param renderers: Number of the threads rendering.
+        :param writers: Number of the threads saving and deleting.
+        :param duration: Seconds the threads run for.
+        :return: Dictionary of the results.
+        """
+        from django.db import connection
+
+        deadline = time.time() + duration
+        rng = random.Random(seed)
+
+        def target(function, thread_seed):
+            try:
+                function(random.Random(thread_seed), deadline)
+            finally:
+                # Each thread has its own connection.
+                connection.close()
+
+        threads = [
+            threading.Thread(target=target,
+                             args=(function, rng.random()))
+            for function, count in ((self.render, renderers),
+                                    (self.write, writers))
+            for i in range(count)
+        ]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+
+        latencies = sorted(self.latencies)
+        milliseconds = lambda seconds: (
+            None if seconds is None else round(seconds * 1e3, 3))
+        return {
+            'seconds': round(elapsed, 3),
+            'renders': len(latencies),
+            'renders_per_second': round(len(latencies) / elapsed, 1),
+            'render_ms': {
+                'p50': milliseconds(percentile(latencies, 0.5)),
+                'p95': milliseconds(percentile(latencies, 0.95)),
+                'p99': milliseconds(percentile(latencies, 0.99)),
+                'max': milliseconds(latencies[-1] if latencies else None),
+            },
+            'operations': self.operations,
+            'errors': self.errors,
+            'index': check_index(self.corpus),
+        }
+
+
+def check_index(corpus):
+    """
+    Compare the index with the entries the objects should have.
+
+    :return: Dictionary with the numbers of the entries missing from the
+        index and of the entries in it which should not be, by model.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from smartlinks.models import IndexEntry
+
+    report = {'consistent': True, 'models': {}}
+    for model in corpus.models:
+        conf = corpus.confs[model]
+        expected = set(
+            (value, instance.pk)
+            for instance in conf.get_queryset().all()
+            for value in conf._get_search_strings_for_index(instance))
+        actual = set(IndexEntry.objects.filter(
+            content_type=ContentType.objects.get_for_model(model)
+        ).values_list('value', 'object_id'))
+        missing, stale = len(expected - actual), len(actual - expected)
+        report['models'][model._meta.model_name] = {
+            'entries': len(actual),
+            'missing': missing,
+            'stale': stale,
+        }
+        if missing or stale:
+            report['consistent'] = False
+    return report
+
+
+def main(argv=None):
+    parser = OptionParser(usage=__doc__)
+    parser.add_option('--renderers', type='int', default=8,
+                      help='Number of the threads rendering.')
+    parser.add_option('--writers', type='int', default=2,
+                      help='Number of the threads saving and deleting.')
+    parser.add_option('--duration', type='float', default=10.0,
+                      help='Seconds the threads run for.')
+    parser.add_option('--models', type='int', default=4)
+    parser.add_option('--objects', type='int', default=1000,
+                      help='Number of the objects of each model.')
+    parser.add_option('--links', type='int', default=20,
+                      help='Number of the smartlinks per document.')
+    parser.add_option('--documents', type='int', default=100)
+    parser.add_option('--timeout', type='float',
+                      help='Seconds SQLite waits for a lock.')
+    parser.add_option('--database', help='Path of the SQLite database file.')
+    parser.add_option('--seed', type='int', default=0)
+    options, args = parser.parse_args(argv)
+
+    path = configure(options.database, timeout=options.timeout)
+
+    import django
+    from smartlinks.benchmarks.corpus import Corpus
+
+    corpus = Corpus(models=options.models, objects=options.objects,
+                    links=options.links, seed=options.seed)
+    corpus.create(signals=True)
+
+    parameters = corpus.parameters()
+    parameters.update(renderers=options.renderers, writers=options.writers,
+                      duration=options.duration, documents=options.documents,
+                      timeout=options.timeout, seed=options.seed)
+    load = Load(corpus, options.documents)
+    print(json.dumps({
+        'benchmark': 'load',
+        'parameters': parameters,
+        'environment': {
+            'django': django.get_version(),
+            'database': path,
+        },
+        'results': load.run(options.renderers, options.writers,
+                            options.duration, options.seed),
+    }, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
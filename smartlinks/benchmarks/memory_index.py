@@ -0,0 +1,108 @@
+"""
+Memory taken by :py:class:`smartlinks.memory_index.MemoryIndex` and its
+lookup latency. Makes no database queries, but importing ``smartlinks`` needs
+Django, which is configured as for the other benchmarks::
+
+    python -m smartlinks.benchmarks.memory_index --entries 1000000
+"""
+from optparse import OptionParser
+import json
+import platform
+import random
+import string
+import sys
+import time
+
+from smartlinks.benchmarks.database import configure
+
+
+def make_entries(count, values_per_object=4, seed=0):
+    """
+    Generate ``count`` synthetic ``(value, object id)`` index entries, with
+    stems looking like the ones generated from titles, years and ids.
+    """
+    rng = random.Random(seed)
+    entries = []
+    object_id = 0
+    while len(entries) < count:
+        object_id += 1
+        title = u"".join(rng.choice(string.ascii_lowercase)
+                         for i in range(rng.randint(6, 24)))
+        year = rng.randint(1900, 2020)
+        values = [title, u"%s%s" % (title, year),
+                  u"%sreleasedin%s" % (title, year), u"%s" % object_id]
+        for value in values[:values_per_object]:
+            entries.append((value, object_id))
+    return entries[:count]
+
+
+def measure_memory(index):
+    """
+    :return: Bytes taken by the index, counting the containers, the values
+        and the object ids.
+    """
+    size = sys.getsizeof(index._values) + sys.getsizeof(index._ids)
+    size += sys.getsizeof(index._by_object)
+    size += sum(sys.getsizeof(value) for value in index._values)
+    size += sum(sys.getsizeof(object_id) + sys.getsizeof(values)
+                for object_id, values in index._by_object.items())
+    return size
+
+
+def time_lookups(index, stems):
+    """
+    :return: Mean time of ``index.find`` for the ``stems``, in microseconds.
+    """
+    start = time.time()
+    for stem in stems:
+        index.find(stem)
+    return (time.time() - start) / len(stems) * 1e6
+
+
+def run(entries_count, lookups=10000):
+    from smartlinks.memory_index import MemoryIndex
+
+    entries = make_entries(entries_count)
+
+    start = time.time()
+    index = MemoryIndex(entries)
+    build_seconds = time.time() - start
+
+    rng = random.Random(1)
+    lookups = min(lookups, entries_count)
+    sample = [value for value, object_id in rng.sample(entries, lookups)]
+    memory = measure_memory(index)
+
+    start = time.time()
+    for value, object_id in rng.sample(entries, 100):
+        index.set_object(object_id, [value + u"x"])
+    update_us = (time.time() - start) / 100 * 1e6
+
+    return {
+        'entries': entries_count,
+        'build_seconds': round(build_seconds, 3),
+        'memory_bytes': memory,
+        'memory_bytes_per_entry': round(float(memory) / entries_count, 1),
+        'exact_lookup_us': round(time_lookups(index, sample), 2),
+        'prefix_lookup_us': round(
+            time_lookups(index, [stem[:4] for stem in sample]), 2),
+        'miss_lookup_us': round(
+            time_lookups(index, [u"zz" + stem for stem in sample]), 2),
+        'update_us': round(update_us, 2),
+    }
+
+
+def main(argv=None):
+    parser = OptionParser(usage=__doc__)
+    parser.add_option('--entries', type='int', action='append',
+                      help='Number of index entries, can be repeated.')
+    options, args = parser.parse_args(argv)
+    configure()
+    results = [run(count) for count in options.entries or [1000, 1000000]]
+    print(json.dumps({'benchmark': 'memory_index',
+                      'python': platform.python_version(),
+                      'results': results}, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
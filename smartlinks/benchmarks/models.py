@@ -0,0 +1,37 @@
+"""
+Models smartlinked to by the benchmarks, all alike: :py:data:`MODEL_COUNT`
+concrete subclasses of :py:class:`Entity`, ``Entity0``, ``Entity1``...
+"""
+from django.db import models
+
+#: Number of the models generated, the most the corpus can be spread over.
+MODEL_COUNT = 8
+
+
+class Entity(models.Model):
+    title = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=200)
+
+    class Meta:
+        abstract = True
+
+    def __unicode__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return u"/%s/%s/" % (self._meta.model_name, self.slug)
+
+
+#: Generated models, in order.
+entity_models = []
+for i in range(MODEL_COUNT):
+    entity_models.append(type('Entity%s' % i, (Entity,),
+                              {'__module__': __name__}))
+    globals()['Entity%s' % i] = entity_models[-1]
+
+
+class Document(models.Model):
+    """
+    Text with smartlinks, for the benchmarks saving it.
+    """
+    body = models.TextField()
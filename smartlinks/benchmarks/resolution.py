@@ -0,0 +1,188 @@
+"""
+Speed of parsing, resolution and index maintenance on a synthetic corpus
+(see :py:class:`smartlinks.benchmarks.corpus.Corpus`), on SQLite::
+
+    python -m smartlinks.benchmarks.resolution --objects 10000 --links 50
+
+Times the rendering of documents by ``process_smartlinks``, the typed and
+untyped resolution of single smartlinks, ``update_index_for_object`` for
+created, edited and deleted objects and the full rebuild of the index.
+"""
+from optparse import OptionParser
+import json
+import platform
+import time
+
+from smartlinks.benchmarks.database import configure
+
+
+def measure(function, calls):
+    """
+    Call ``function(i)`` for ``i`` in ``range(calls)``.
+
+    :return: Dictionary with the mean and the minimum time per call in
+        milliseconds, and the mean number of queries per call.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    times = []
+    with CaptureQueriesContext(connection) as queries:
+        for i in range(calls):
+            start = time.time()
+            function(i)
+            times.append(time.time() - start)
+    return {
+        'calls': calls,
+        'mean_ms': round(sum(times) / calls * 1e3, 3),
+        'min_ms': round(min(times) * 1e3, 3),
+        'queries_per_call': round(float(len(queries)) / calls, 2),
+    }
+
+
+def bench_rendering(corpus, documents):
+    from smartlinks.conf import smartlinks_conf
+    from smartlinks.parser import SmartLinkParser, SmartTextParser
+
+    results = {}
+    for typed in (None, True, False):
+        texts = [corpus.document(typed) for i in range(documents)]
+        name = {None: 'mixed', True: 'typed', False: 'untyped'}[typed]
+        results['batch_%s' % name] = measure(
+            lambda i: SmartTextParser(smartlinks_conf, batch=True)
+            .process_smartlinks(texts[i]), documents)
+        results['one_by_one_%s' % name] = measure(
+            lambda i: SmartLinkParser(smartlinks_conf)
+            .process_smartlinks(texts[i]), documents)
+    return results
+
+
+def bench_resolution(corpus, calls):
+    from smartlinks.conf import find_objects_in_confs
+
+    confs = [corpus.confs[model] for model in corpus.models]
+    queries = []
+    for i in range(calls):
+        model = corpus.rng.choice(corpus.models)
+        queries.append((corpus.confs[model],
+                        corpus.rng.choice(corpus.titles[model])))
+
+    return {
+        'typed': measure(lambda i: queries[i][0].find_object(queries[i][1]),
+                         calls),
+        'untyped': measure(
+            lambda i: find_objects_in_confs(confs, [queries[i][1]]), calls),
+    }
+
+
+def bench_index_maintenance(corpus, calls):
+    model = corpus.models[0]
+    conf = corpus.confs[model]
+    instances = []
+
+    def create(i):
+        title = corpus.word(12)
+        instance = model.objects.create(title=title, slug=title)
+        conf.update_index_for_object(model, instance, created=True)
+        instances.append(instance)
+
+    def update(i):
+        instance = instances[i]
+        instance.title = corpus.word(12)
+        instance.save()
+        conf.update_index_for_object(model, instance, created=False)
+
+    def delete(i):
+        instance = instances[i]
+        model.objects.filter(pk=instance.pk).delete()
+        conf.update_index_for_object(model, instance, created='deleteme')
+
+    # The model saves and deletes are included in the timings.
+    return {
+        'create': measure(create, calls),
+        'update': measure(update, calls),
+        'delete': measure(delete, calls),
+    }
+
+
+def bench_rebuild(corpus):
+    from django.contrib.contenttypes.models import ContentType
+    from smartlinks.models import IndexEntry
+
+    IndexEntry.objects.filter(content_type__in=[
+        ContentType.objects.get_for_model(model) for model in corpus.models
+    ]).delete()
+
+    start = time.time()
+    entries = sum(corpus.confs[model].recreate_index()
+                  for model in corpus.models)
+    seconds = time.time() - start
+    return {
+        'entries': entries,
+        'seconds': round(seconds, 3),
+        'entries_per_second': round(entries / seconds, 1) if seconds else None,
+    }
+
+
+def run(corpus, documents=50, calls=200):
+    """
+    :param corpus: Created :py:class:`smartlinks.benchmarks.corpus.Corpus`.
+    :param documents: Number of the documents rendered in each mode.
+    :param calls: Number of the resolutions and index updates timed.
+    :return: Dictionary of the results.
+    """
+    return {
+        'rendering': bench_rendering(corpus, documents),
+        'resolution': bench_resolution(corpus, calls),
+        'index_maintenance': bench_index_maintenance(corpus, calls),
+        'rebuild': bench_rebuild(corpus),
+    }
+
+
+def main(argv=None):
+    parser = OptionParser(usage=__doc__)
+    parser.add_option('--models', type='int', default=4)
+    parser.add_option('--objects', type='int', default=1000,
+                      help='Number of the objects of each model.')
+    parser.add_option('--links', type='int', default=20,
+                      help='Number of the smartlinks per document.')
+    parser.add_option('--hits', type='float', default=0.8)
+    parser.add_option('--ambiguous', type='float', default=0.1)
+    parser.add_option('--typed', type='float', default=0.5)
+    parser.add_option('--documents', type='int', default=50)
+    parser.add_option('--calls', type='int', default=200)
+    parser.add_option('--database', help='Path of the SQLite database file.')
+    parser.add_option('--seed', type='int', default=0)
+    options, args = parser.parse_args(argv)
+
+    configure(options.database)
+
+    import django
+    from smartlinks.benchmarks.corpus import Corpus
+
+    corpus = Corpus(models=options.models, objects=options.objects,
+                    links=options.links, hits=options.hits,
+                    ambiguous=options.ambiguous, typed=options.typed,
+                    seed=options.seed)
+    start = time.time()
+    entries = corpus.create()
+    setup_seconds = time.time() - start
+
+    parameters = corpus.parameters()
+    parameters.update(documents=options.documents, calls=options.calls,
+                      seed=options.seed)
+    print(json.dumps({
+        'benchmark': 'resolution',
+        'parameters': parameters,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': 'sqlite3',
+        },
+        'setup': {'entries': entries, 'seconds': round(setup_seconds, 3)},
+        'results': run(corpus, options.documents, options.calls),
+    }, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
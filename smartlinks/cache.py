@@ -0,0 +1,320 @@
+"""
+Caches for the outcomes of the smartlink resolution.
+"""
+from collections import OrderedDict
+import hashlib
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import six
+from django.utils.encoding import force_bytes
+from django.utils.safestring import mark_safe
+
+#: Key of the generation of the whole index, used by the cache of the
+#: rendered output.
+INDEX_GENERATION_KEY = 'smartlinks:index-generation'
+
+_random = random.SystemRandom()
+
+
+class LRUResolutionCache(object):
+    """
+    In-process cache of the index lookups done by
+    :py:meth:`smartlinks.conf.SmartLinkConf.find_object`.
+
+    Maps ``(content type id, stemmed query)`` to the outcome of the lookup:
+    the id of the object found, :py:data:`smartlinks.conf.UNRESOLVED` or
+    :py:data:`smartlinks.conf.AMBIGUOUS`. The least recently used entries are
+    evicted once there are more then ``max_size`` of them, and each entry
+    expires ``ttl`` seconds after it was stored (``None`` for no expiry).
+
+    .. highlight:: python
+
+    Usage::
+
+        register_smart_link(('m', 'movie'), SmartLinkConf(
+            Movie.objects,
+            resolution_cache=LRUResolutionCache(max_size=10000, ttl=300)
+        ))
+
+    The entries for a content type are dropped whenever
+    :py:meth:`smartlinks.conf.SmartLinkConf.update_index_for_object` runs for
+    one of its objects, ie on ``post_save`` and ``post_delete``.
+
+    .. warning:: Other processes are not notified of the invalidation,
+        in multi-process deployments ``ttl`` is what bounds the staleness.
+
+    Counters :py:attr:`hits` and :py:attr:`misses` are kept to help sizing
+    the cache.
+    """
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        #: Number of stems found in the cache.
+        self.hits = 0
+
+        #: Number of stems looked up in the cache but not found there.
+        self.misses = 0
+
+        # Maps ``(content type id, stem)`` to ``(expiry time, outcome)``,
+        # least recently used first.
+        self._entries = OrderedDict()
+
+        # Maps content type ids to the number of their invalidations.
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, content_type_id):
+        """
+        :return: Generation of the entries for the content type, changed by
+            every :py:meth:`invalidate`. Read once per lookup and passed to
+            both :py:meth:`get_many` and :py:meth:`set_many`, so that the
+            outcomes of a lookup overtaken by an invalidation are not stored.
+        """
+        return self._generations.get(content_type_id, 0)
+
+    def get_many(self, content_type_id, stems, generation=None):
+        """
+        :param content_type_id: Id of the content type searched in.
+        :param stems: Iterable of stemmed queries.
+        :param generation: Result of :py:meth:`generation`, read now if
+            ``None``.
+        :return: Dictionary mapping the stems found in the cache to the
+            cached outcomes.
+        """
+        now = time.time()
+        found = {}
+        with self._lock:
+            for stem in stems:
+                key = (content_type_id, stem)
+                entry = self._entries.pop(key, None)
+                if entry is None or (entry[0] is not None and entry[0] <= now):
+                    self.misses += 1
+                    continue
+
+                # Re-inserting marks the entry as the most recently used.
+                self._entries[key] = entry
+                found[stem] = entry[1]
+                self.hits += 1
+        return found
+
+    def set_many(self, content_type_id, outcomes, generation=None):
+        """
+        :param content_type_id: Id of the content type searched in.
+        :param outcomes: Dictionary mapping stemmed queries to outcomes.
+        :param generation: Result of :py:meth:`generation` read before the
+            outcomes were looked up, nothing is stored if the content type
+            was invalidated since.
+        """
+        expires = None if self.ttl is None else time.time() + self.ttl
+        with self._lock:
+            if (generation is not None
+                    and generation != self.generation(content_type_id)):
+                return
+            for stem, outcome in outcomes.items():
+                key = (content_type_id, stem)
+                self._entries.pop(key, None)
+                self._entries[key] = (expires, outcome)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, content_type_id):
+        """
+        Drop all the entries for the content type.
+        """
+        with self._lock:
+            self._generations[content_type_id] = (
+                self.generation(content_type_id) + 1)
+            for key in [key for key in self._entries
+                        if key[0] == content_type_id]:
+                del self._entries[key]
+
+    def clear(self):
+        """
+        Drop all the entries and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoResolutionCache(object):
+    """
+    Cache of the index lookups done by
+    :py:meth:`smartlinks.conf.SmartLinkConf.find_object` on top of the Django
+    cache framework, shared by all the processes using the same cache.
+
+    Stores the same outcomes as :py:class:`LRUResolutionCache`, under keys
+    which include a per content type generation number. Invalidation just
+    increments the generation, entries of the previous generations are
+    never read again and expire on their own after ``timeout`` seconds.
+
+    .. highlight:: python
+
+    Usage::
+
+        register_smart_link(('m', 'movie'), SmartLinkConf(
+            Movie.objects,
+            resolution_cache=DjangoResolutionCache('default', timeout=600)
+        ))
+    """
+
+    def __init__(self, alias='default', timeout=300, key_prefix='smartlinks'):
+        """
+        :param alias: Name of the cache in ``settings.CACHES``.
+        :param timeout: Expiry time of the entries, in seconds.
+        :param key_prefix: Prefix for all the keys used.
+        """
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+        #: Number of stems found in the cache by this process.
+        self.hits = 0
+
+        #: Number of stems not found in the cache by this process.
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_many(self, content_type_id, stems, generation=None):
+        """
+        Same as :py:meth:`LRUResolutionCache.get_many`.
+        """
+        if generation is None:
+            generation = self.generation(content_type_id)
+        keys = dict((self._make_key(content_type_id, generation, stem), stem)
+                    for stem in stems)
+        found = dict((keys[key], outcome) for key, outcome
+                     in self.cache.get_many(keys.keys()).items())
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, content_type_id, outcomes, generation=None):
+        """
+        Same as :py:meth:`LRUResolutionCache.set_many`: outcomes looked up
+        before an invalidation are stored under the previous generation,
+        where they are never read.
+        """
+        if generation is None:
+            generation = self.generation(content_type_id)
+        self.cache.set_many(dict(
+            (self._make_key(content_type_id, generation, stem), outcome)
+            for stem, outcome in outcomes.items()
+        ), self.timeout)
+
+    def invalidate(self, content_type_id):
+        """
+        Bump the generation for the content type.
+        """
+        key = self._generation_key(content_type_id)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Not there anymore, the next lookup starts a new generation.
+            pass
+
+    def generation(self, content_type_id):
+        """
+        Same as :py:meth:`LRUResolutionCache.generation`.
+        """
+        key = self._generation_key(content_type_id)
+        generation = self.cache.get(key)
+        if generation is None:
+            self.cache.add(key, new_generation(), None)
+            generation = self.cache.get(key, 0)
+        return generation
+
+    def _generation_key(self, content_type_id):
+        return '%s:generation:%s' % (self.key_prefix, content_type_id)
+
+    def _make_key(self, content_type_id, generation, stem):
+        return '%s:%s:%s:%s' % (
+            self.key_prefix, content_type_id, generation,
+            hashlib.md5(stem.encode('utf-8')).hexdigest()
+        )
+
+
+def new_generation():
+    """
+    :return: Random start for a generation counter, so that a counter lost
+        from the cache (evicted, or on a restart of the cache) is not
+        restarted at a value it already went through, which would make the
+        entries stored under that value current again.
+    """
+    return _random.getrandbits(62)
+
+
+def cached_render(value, render):
+    """
+    Cache of the output of the ``smartlinks`` filter, enabled by setting
+    ``SMARTLINKS_RENDER_CACHE`` to the name of a cache in ``settings.CACHES``.
+
+    The output is stored under a hash of the input text together with the
+    index generation, which is bumped by :py:func:`bump_index_generation`
+    whenever the index changes, so that unchanged content is rendered with
+    a single cache round trip.
+
+    Texts longer then ``SMARTLINKS_RENDER_CACHE_MAX_LENGTH`` characters
+    (100000 by default) are never cached. Entries expire after
+    ``SMARTLINKS_RENDER_CACHE_TIMEOUT`` seconds (300 by default).
+
+    .. warning:: Smartembeds are cached as well, an embeddable attribute
+        whose output changes without the index changing will be stale until
+        the entry expires.
+
+    :param value: Text to render.
+    :param render: Function doing the actual rendering.
+    :rtype: SafeString
+    """
+    cache = _get_render_cache()
+    max_length = getattr(settings, 'SMARTLINKS_RENDER_CACHE_MAX_LENGTH', 100000)
+    if (cache is None or not isinstance(value, six.string_types)
+            or len(value) > max_length):
+        return render(value)
+
+    key = 'smartlinks:rendered:%s' % hashlib.sha1(force_bytes(value)).hexdigest()
+    found = cache.get_many([INDEX_GENERATION_KEY, key])
+    generation = found.get(INDEX_GENERATION_KEY)
+    if generation is None:
+        cache.add(INDEX_GENERATION_KEY, new_generation(), None)
+        generation = cache.get(INDEX_GENERATION_KEY, 0)
+    elif key in found and found[key][0] == generation:
+        return mark_safe(found[key][1])
+
+    output = render(value)
+    cache.set(key, (generation, output),
+              getattr(settings, 'SMARTLINKS_RENDER_CACHE_TIMEOUT', 300))
+    return output
+
+
+def bump_index_generation():
+    """
+    Invalidate all the output cached by :py:func:`cached_render`.
+    Called whenever the index changes.
+    """
+    cache = _get_render_cache()
+    if cache is None:
+        return
+    try:
+        cache.incr(INDEX_GENERATION_KEY)
+    except ValueError:
+        # Not there anymore, the next render starts a new generation.
+        pass
+
+
+def _get_render_cache():
+    alias = getattr(settings, 'SMARTLINKS_RENDER_CACHE', None)
+    if alias:
+        return caches[alias]
@@ -1,11 +1,24 @@
-from collections import OrderedDict as SortedDict
-from django.db import IntegrityError
+from collections import OrderedDict as SortedDict, defaultdict
+import datetime
+from decimal import Decimal
+from functools import reduce
+from itertools import islice
+import operator
+import threading
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
+from django.utils import six
 from django.utils.functional import SimpleLazyObject
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
 import re
 
-from django.template import Template
+from django.template import Context, Template
 from django.contrib.contenttypes.models import ContentType
 
+from smartlinks.cache import bump_index_generation
+from smartlinks.memory_index import MemoryIndex
 from smartlinks.models import IndexEntry, INDEX_ENTRY_LEN
 
 #: Configuration global state. Mutable during initialization.
@@ -13,6 +26,14 @@ from smartlinks.models import IndexEntry, INDEX_ENTRY_LEN
 #: Maps model shortcuts to :py:class:`SmartLinkConf` instances.
 smartlinks_conf = SortedDict()
 
+#: Outcome of the index lookup for a stemmed query which does not correspond
+#: to any object.
+UNRESOLVED = 'unresolved'
+
+#: Outcome of the index lookup for a stemmed query which corresponds to more
+#: then one index entry.
+AMBIGUOUS = 'ambiguous'
+
 
 # Lazy version of Template, which imports template tag libraries, which import
 # models, which aren't ready yet (Django 1.7+ app loading).
@@ -183,6 +204,44 @@ class SmartLinkConf(object):
     disallowed_embed_template = lazy_template(
         '<span class="smartlinks-unallowed">{{ smartlink_text }}</span>')
 
+    #: Optional cache for the outcomes of the index lookups, either
+    #: :py:class:`smartlinks.cache.LRUResolutionCache` or
+    #: :py:class:`smartlinks.cache.DjangoResolutionCache`. The cache is
+    #: invalidated by :py:meth:`update_index_for_object` and
+    #: :py:meth:`recreate_index`.
+    resolution_cache = None
+
+    #: If ``True``, the index entries for the model are loaded into a
+    #: :py:class:`smartlinks.memory_index.MemoryIndex` on the first lookup
+    #: and the lookups make no database queries. The copy is kept up to date
+    #: by :py:meth:`update_index_for_object` in this process only, see
+    #: :ref:`memory-index`.
+    memory_index = False
+
+    #: Number of instances fetched and indexed per transaction by
+    #: :py:meth:`recreate_index`.
+    index_chunk_size = 500
+
+    #: Names of the model fields the index entries of an instance depend on.
+    #: Saves which change none of them leave the index alone. If ``None``,
+    #: they are worked out from :py:attr:`searched_fields` during the
+    #: registration, see :py:meth:`get_index_dependencies`.
+    index_dependencies = None
+
+    #: Number of saves for which the index was updated.
+    reindexes_performed = 0
+
+    #: Number of saves for which updating the index was skipped, as none of
+    #: the fields it depends on changed.
+    reindexes_skipped = 0
+
+    # Set of the field names the index depends on, as worked out during the
+    # registration, ``None`` if any change can affect the index.
+    _dependencies = None
+
+    # Loaded :py:class:`MemoryIndex`, if :py:attr:`memory_index` is set.
+    _memory_index = None
+    _memory_index_lock = threading.Lock()
 
     def __init__(self,
                  queryset=None,
@@ -192,7 +251,10 @@ class SmartLinkConf(object):
                  unresolved_template=None,
                  model_unresolved_template=None,
                  ambiguous_template=None,
-                 disallowed_embed_template=None
+                 disallowed_embed_template=None,
+                 resolution_cache=None,
+                 index_dependencies=None,
+                 memory_index=None
     ):
         if queryset is not None:
             self.queryset = queryset
@@ -216,6 +278,33 @@ class SmartLinkConf(object):
             self.unresolved_template = unresolved_template
         if disallowed_embed_template is not None:
             self.disallowed_embed_template = disallowed_embed_template
+        if resolution_cache is not None:
+            self.resolution_cache = resolution_cache
+        if index_dependencies is not None:
+            self.index_dependencies = index_dependencies
+        if memory_index is not None:
+            self.memory_index = memory_index
+
+    def render(self, name, context):
+        """
+        Render one of the templates of the configuration.
+
+        The default templates are rendered with precompiled format strings,
+        escaping the values as Django would, without building a
+        :py:class:`Context`. Templates overridden in a subclass or passed to
+        the constructor are rendered by Django.
+
+        :param name: Name of the template attribute, eg ``'template'`` or
+            ``'unresolved_template'``.
+        :param context: Dictionary of the variables available.
+        :rtype: SafeString
+        """
+        template = getattr(self, name)
+        if template is getattr(SmartLinkConf, name, None):
+            output = _render_default(name, context)
+            if output is not None:
+                return output
+        return template.render(Context(context))
 
     def get_queryset(self):
         if callable(self.queryset):
@@ -272,27 +361,159 @@ class SmartLinkConf(object):
             - :py:class:`IndexEntry`.DoesNotExist Django exception.
             - :py:class:`IndexEntry`.MultipleObjectsReturned Django exception.
         """
+        outcome = self._find_objects_in_index([query])[query]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def find_objects(self, queries):
+        """
+        Batch version of :py:meth:`find_object`: resolves all the ``queries``
+        at once, using one exact and at most one prefix lookup in the index and
+        one query to fetch the found objects, regardless of the number of
+        queries.
+
+        If :py:meth:`find_object` is overridden, it is called for each query
+        instead, as the index can not be relied upon.
+
+        :param queries: Iterable of strings to search in index for.
+
+        :return: Dictionary mapping each query either to the object found or
+            to the ``DoesNotExist`` or ``MultipleObjectsReturned`` exception
+            :py:meth:`find_object` would have raised for it.
+        """
+        queries = set(queries)
+
+        if type(self).find_object != SmartLinkConf.find_object:
+            return dict((query, _outcome(self.find_object, query))
+                        for query in queries)
+        return self._find_objects_in_index(queries)
+
+    def _find_objects_in_index(self, queries):
+        """
+        Look the ``queries`` up in the index, what both
+        :py:meth:`find_object` and :py:meth:`find_objects` do unless
+        overridden.
+
+        :param queries: Set of strings to search in index for.
+        :return: Same as :py:meth:`find_objects`.
+        """
+        stems = dict((query, self._stem(query)) for query in queries)
+        return self._get_outcomes(stems, self._lookup(set(stems.values())))
+
+    def _get_outcomes(self, stems, found):
+        """
+        Fetch the objects found by :py:meth:`_lookup`, with a single query
+        through :py:meth:`get_queryset`, so that its ``select_related()`` or
+        ``only()`` apply. Objects no longer in the queryset are reported as
+        not found.
+
+        :param stems: Dictionary mapping the queries to their stems.
+        :param found: Dictionary mapping the stems to the lookup outcomes.
+        :return: Same as :py:meth:`find_objects`.
+        """
+        object_ids = set(found[stem] for stem in stems.values()) - set(
+            [UNRESOLVED, AMBIGUOUS])
+        objects = {}
+        if object_ids:
+            objects = self.get_queryset().in_bulk(list(object_ids))
+
+        outcomes = {}
+        for query, stem in stems.items():
+            object_id = found[stem]
+            if object_id == UNRESOLVED:
+                outcomes[query] = IndexEntry.DoesNotExist()
+            elif object_id == AMBIGUOUS:
+                outcomes[query] = IndexEntry.MultipleObjectsReturned()
+            elif object_id not in objects:
+                outcomes[query] = IndexEntry.DoesNotExist()
+            else:
+                outcomes[query] = objects[object_id]
+        return outcomes
+
+    def _lookup(self, stems):
+        """
+        Look the stemmed queries up in the index, going through
+        :py:attr:`resolution_cache` if there is one, or in the
+        :py:attr:`memory_index` if enabled.
+
+        :param stems: Set of stemmed queries.
+
+        :return: Dictionary mapping each stem to the id of the object it
+            resolves to, :py:data:`UNRESOLVED` or :py:data:`AMBIGUOUS`.
+        """
+        content_type = ContentType.objects.get_for_model(self.resolve_model())
+        if self.memory_index:
+            index = self._get_memory_index(content_type)
+            return dict((stem, _single(index.find(stem)) if stem
+                         else UNRESOLVED) for stem in stems)
+        if self.resolution_cache is None:
+            return self._lookup_in_index(content_type, stems)
+
+        # Outcomes looked up before a concurrent invalidation must not be
+        # stored as current ones.
+        generation = self.resolution_cache.generation(content_type.pk)
+        found = self.resolution_cache.get_many(content_type.pk, stems,
+                                               generation)
+        missing = set(stems) - set(found)
+        if missing:
+            looked_up = self._lookup_in_index(content_type, missing)
+            self.resolution_cache.set_many(content_type.pk, looked_up,
+                                           generation)
+            found.update(looked_up)
+        return found
+
+    def _lookup_in_index(self, content_type, stems):
+        """
+        Look the stemmed queries up in the :py:class:`IndexEntry` table,
+        see :py:func:`lookup_in_index`.
+
+        :param content_type: Content type of the smartlinked model.
+        :param stems: Set of stemmed queries.
 
+        :return: Same as :py:meth:`_lookup`.
+        """
+        return lookup_in_index({content_type.pk: stems})[content_type.pk]
 
-        query = dict(
-            value=self._stem(query),
-            content_type=ContentType.objects.get_for_model(self.resolve_model())
+    def _shares_index_lookup(self):
+        """
+        :return: Whether the lookups for this configuration are plain
+            :py:class:`IndexEntry` queries, which
+            :py:func:`find_objects_in_confs` can make together with the ones
+            of other configurations.
+        """
+        cls = type(self)
+        return (
+            cls.find_object == SmartLinkConf.find_object
+            and cls.find_objects == SmartLinkConf.find_objects
+            and cls._lookup == SmartLinkConf._lookup
+            and cls._lookup_in_index == SmartLinkConf._lookup_in_index
+            and self.resolution_cache is None
+            and not self.memory_index
+            and self.resolve_model() is not None
         )
 
-        try:
-            return IndexEntry.objects.get(**query).content_object
-        except IndexEntry.DoesNotExist:
-            # A fallback in case we can't find an exact match -
-            # let's just contend ourselves with STARTSWITH.
-            query['value__startswith'] = query['value']
-            del query['value']
-            return IndexEntry.objects.get(**query).content_object
+    def _get_memory_index(self, content_type):
+        """
+        :return: The :py:class:`MemoryIndex` for the model, loading it from
+            the :py:class:`IndexEntry` table on the first call.
+        """
+        with self._memory_index_lock:
+            if self._memory_index is None:
+                self._memory_index = MemoryIndex(
+                    IndexEntry.objects.filter(content_type=content_type)
+                    .values_list('value', 'object_id').iterator())
+            return self._memory_index
 
     def update_index_for_object(self, sender, instance, created='deleteme', **kw):
         """
         Update index for the updated/deleted/created object.
         Creates/Removes SmartLinkIndex objects.
 
+        For edited objects only the entries whose values changed are deleted
+        or inserted, nothing is written if none did. Entries inserted
+        meanwhile by a concurrent save are skipped.
+
         This method gets attached to the ``post_save`` and ``post_delete``
         signals by the function :py:func:`register`.
 
@@ -302,6 +523,11 @@ class SmartLinkConf(object):
         At that point the best bet will be to run ``./manage.py reset_smartlink_index``,
         see :py:meth:`recreate_index`.
 
+        When entries are added or removed, the
+        :py:class:`smartlinks.fields.RenderedSmartTextField` fields which
+        might show the object, or resolve differently, are re-rendered, see
+        :py:func:`smartlinks.references.rerender_dependents`.
+
         :param sender: SmartLinked model, subclass of Django's models.Model.
         :param instance: Instance of the model being processed for SmartLink
         caching.
@@ -312,36 +538,246 @@ class SmartLinkConf(object):
             - True: object is created.
             - 'deleteme': object is deleted.
         """
+        from smartlinks.references import rendered_fields, rerender_dependents
+
         deleted = created == 'deleteme'
         content_type = ContentType.objects.get_for_model(sender)
+        entries = IndexEntry.objects.filter(
+            content_type=content_type,
+            object_id=instance.pk
+        )
+
+        if deleted:
+            removed = set()
+            if rendered_fields:
+                removed = set(entries.values_list('value', flat=True))
+            entries.delete()
+            if self._memory_index is not None:
+                self._memory_index.remove_object(instance.pk)
+            self.index_changed(content_type)
+            rerender_dependents(removed, instance)
+            return
+
+        if self._dependencies is not None:
+            unchanged = not created and self._is_unchanged(
+                instance, kw.get('update_fields'))
+            self.snapshot_instance(sender, instance, kw.get('update_fields'))
+            if unchanged:
+                self.reindexes_skipped += 1
+                # The rendered output might be showing the changed object.
+                bump_index_generation()
+                return
+        self.reindexes_performed += 1
+
+        # Only the difference between the entries already in the index and
+        # the current ones is written.
+        old_values = set() if created else set(
+            entries.values_list('value', flat=True))
+        new_values = set()
+        if self.get_queryset().filter(pk=instance.pk).exists():
+            new_values = set(self._get_search_strings_for_index(instance))
+
+        if old_values == new_values:
+            # The lookups are not affected, but the rendered output might be
+            # showing the changed object.
+            bump_index_generation()
+            return
+
+        if old_values - new_values:
+            entries.filter(value__in=old_values - new_values).delete()
+        if new_values - old_values:
+            self._add_entries(content_type, instance.pk,
+                              new_values - old_values)
+        if self._memory_index is not None:
+            self._memory_index.set_object(instance.pk, new_values)
+        self.index_changed(content_type)
+        rerender_dependents(old_values ^ new_values, instance)
+
+    def get_index_dependencies(self):
+        """
+        Work out the names of the concrete model fields the index entries
+        of an instance depend on, from :py:attr:`index_dependencies` if
+        specified or from :py:attr:`searched_fields` otherwise.
 
-        if not created or deleted:
-            # Delete the previously cached objects
-            IndexEntry.objects.filter(
-                content_type=content_type,
-                object_id=instance.pk
-            ).delete()
+        Dependencies can not be worked out (and every save updates the index)
+        if any of the searched fields is a method or a property, eg the
+        default ``__unicode__``, if the queryset is filtered, as any field
+        might then decide whether the instance is indexed, or if
+        :py:meth:`_get_search_strings_for_index` is overridden.
 
-        qs_instance = self.get_queryset().filter(pk=instance.pk)
+        Neither can they with dot-notation lookups, as the related objects
+        can change without the relation field changing.
 
-        if not deleted and qs_instance:
-            # Update the index with new entries.
-            for search_string in self._get_search_strings_for_index(instance):
-                IndexEntry.objects.create(
-                    value=search_string,
-                    content_type=content_type,
-                    object_id=instance.pk
-                )
+        :return: Set of field names or ``None``.
+        """
+        if self.index_dependencies is not None:
+            return set(self.index_dependencies)
+
+        model = self.resolve_model()
+        if (model is None
+                or type(self)._get_search_strings_for_index !=
+                SmartLinkConf._get_search_strings_for_index
+                or self.get_queryset().all().query.where):
+            return None
 
-    def recreate_index(self):
+        dependencies = set()
+        for fieldset in self.searched_fields:
+            for fieldname in fieldset:
+                if '.' in fieldname:
+                    return None
+                if fieldname == 'pk':
+                    fieldname = model._meta.pk.name
+                try:
+                    field = model._meta.get_field(fieldname)
+                except FieldDoesNotExist:
+                    return None
+                if field not in model._meta.concrete_fields:
+                    return None
+                dependencies.add(field.name)
+        return dependencies
+
+    def snapshot_instance(self, sender, instance, update_fields=None, **kw):
+        """
+        Remember the values of the fields the index depends on, to tell on
+        the next save whether they have changed.
+
+        Attached to the ``post_init`` signal by the function
+        :py:func:`register` if the dependencies are known.
+
+        :param update_fields: Names of the fields just saved, only those are
+            remembered, the others might hold edits not saved yet. All the
+            fields if ``None``.
+        """
+        fieldnames = self._dependencies
+        if update_fields is not None:
+            fieldnames = fieldnames.intersection(update_fields)
+        snapshot = instance.__dict__.setdefault('_smartlinks_snapshot', {})
+        for fieldname in fieldnames:
+            attname = sender._meta.get_field(fieldname).attname
+            # Deferred fields are not loaded (and not remembered) on purpose.
+            if attname in instance.__dict__:
+                snapshot[attname] = instance.__dict__[attname]
+
+    def _is_unchanged(self, instance, update_fields=None):
+        """
+        :return: ``True`` if none of the fields the index depends on has
+        changed since the instance was loaded or last saved.
+        """
+        if update_fields is not None:
+            return not self._dependencies.intersection(update_fields)
+
+        snapshot = instance.__dict__.get('_smartlinks_snapshot', {})
+        for fieldname in self._dependencies:
+            attname = instance._meta.get_field(fieldname).attname
+            if (attname not in snapshot or attname not in instance.__dict__
+                    or snapshot[attname] != instance.__dict__[attname]):
+                return False
+        return True
+
+    def _add_entries(self, content_type, object_id, values):
+        """
+        Add entries with ``values`` for the object to the index, skipping
+        the ones already there, eg inserted by a concurrent save.
+        """
+        try:
+            with transaction.atomic():
+                IndexEntry.objects.bulk_create([
+                    IndexEntry(value=value,
+                               content_type=content_type,
+                               object_id=object_id)
+                    for value in values
+                ])
+        except IntegrityError:
+            for value in values:
+                try:
+                    with transaction.atomic():
+                        IndexEntry.objects.create(
+                            value=value,
+                            content_type=content_type,
+                            object_id=object_id
+                        )
+                except IntegrityError:
+                    pass
+
+    def recreate_index(self, chunk_size=None):
         """
         Re-create the index for the ``self.queryset`` if it exists.
         Assumes the index is empty.
+
+        Unlike calling :py:meth:`update_index_for_object` for every instance,
+        the search strings are computed for chunks of instances and each chunk
+        is written with a single ``bulk_create`` in its own transaction.
+        Instances are not re-checked against the queryset, as that is where
+        they come from.
+
+        Instances are streamed chunk by chunk (see :py:meth:`iter_chunks`), so
+        the memory used does not depend on the size of the table.
+
+        :param chunk_size: Number of instances per chunk, defaults to
+            :py:attr:`index_chunk_size`.
+        :return: Number of the index entries created.
+        """
+        if self.get_queryset() is None:
+            return 0
+
+        content_type = ContentType.objects.get_for_model(self.resolve_model())
+        created = 0
+        for chunk in self.iter_chunks(chunk_size):
+            entries = [
+                IndexEntry(value=search_string,
+                           content_type=content_type,
+                           object_id=instance.pk)
+                for instance in chunk
+                for search_string in self._get_search_strings_for_index(instance)
+            ]
+            with transaction.atomic():
+                IndexEntry.objects.bulk_create(entries)
+            created += len(entries)
+
+        self.index_changed(content_type, reloaded=True)
+        return created
+
+    def index_changed(self, content_type, reloaded=False):
+        """
+        Invalidate the caches depending on the index, after the entries for
+        the ``content_type`` were changed.
+
+        :param reloaded: Whether all the entries for the ``content_type``
+            were re-created, the memory index is then loaded again on the
+            next lookup.
+        """
+        if reloaded:
+            with self._memory_index_lock:
+                self._memory_index = None
+        # Any lookup for the content type might be affected.
+        if self.resolution_cache is not None:
+            self.resolution_cache.invalidate(content_type.pk)
+        bump_index_generation()
+
+    def iter_chunks(self, chunk_size=None):
         """
-        if self.get_queryset():
-            for instance in self.get_queryset().all():
-                self.update_index_for_object(instance.__class__,
-                    instance, created=True)
+        Iterate over the ``self.queryset`` in lists of at most ``chunk_size``
+        instances, ordered by primary key. Each chunk is fetched with its own
+        query, starting after the last primary key of the previous one
+        (keyset pagination), so only one chunk is held in memory at a time.
+
+        :param chunk_size: Defaults to :py:attr:`index_chunk_size`.
+        """
+        chunk_size = chunk_size or self.index_chunk_size
+        queryset = self.get_queryset().order_by('pk')
+        last_pk = None
+        while True:
+            if last_pk is not None:
+                chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            else:
+                chunk = list(queryset[:chunk_size])
+            if not chunk:
+                return
+            last_pk = chunk[-1].pk
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            del chunk
 
     def _get_search_strings_for_index(self, instance):
         """
@@ -394,7 +830,8 @@ class SmartLinkConf(object):
                         if callable(value):
                             value = value()
 
-                    search_string += unicode(value)
+                # Only the value at the end of the lookup is searched.
+                search_string += unicode(value)
 
             # Stemming has to be performed before throwing out duplicated,
             # because otherwise some duplicates can be missed.
@@ -414,3 +851,257 @@ class SmartLinkConf(object):
         :rtype: string
         """
         return self.stemming_replace.sub(u"", query).lower()[:INDEX_ENTRY_LEN]
+
+
+def find_objects_in_confs(confs, queries):
+    """
+    Resolve the smartlinks without the model name, trying the ``confs`` in
+    order for each query: the first one for which the query does not raise
+    ``DoesNotExist`` wins, even if it is a prefix match and a later one
+    has an exact match.
+
+    The configurations doing plain index lookups are all looked up together,
+    with one exact and usually one prefix query across their content types
+    (see :py:func:`lookup_in_index`), plus one query per configuration
+    fetching the objects it wins. The other ones are asked in turn through
+    :py:meth:`SmartLinkConf.find_objects`, for the queries still unresolved.
+
+    :param confs: Configurations in the registration order, each one once.
+    :param queries: Iterable of strings to search in index for.
+
+    :return: Dictionary mapping each query to ``(conf, outcome)``, where
+        the outcome is the same as in :py:meth:`SmartLinkConf.find_objects`.
+        Queries not found anywhere are reported against the last
+        configuration.
+    """
+    pending = set(queries)
+    resolved = {}
+
+    shared = [conf for conf in confs if conf._shares_index_lookup()]
+    content_types = dict(
+        (conf, ContentType.objects.get_for_model(conf.resolve_model()).pk)
+        for conf in shared
+    )
+    stems_per_content_type = defaultdict(set)
+    for conf in shared:
+        stems_per_content_type[content_types[conf]].update(
+            conf._stem(query) for query in pending)
+    found = lookup_in_index(stems_per_content_type) if pending else {}
+
+    conf = None
+    for conf in confs:
+        if not pending:
+            break
+        if conf in content_types:
+            # Only the objects this configuration wins are fetched.
+            found_here = found[content_types[conf]]
+            stems = dict((query, conf._stem(query)) for query in pending)
+            outcomes = conf._get_outcomes(dict(
+                (query, stem) for query, stem in stems.items()
+                if found_here[stem] != UNRESOLVED
+            ), found_here)
+        else:
+            outcomes = conf.find_objects(pending)
+
+        for query, outcome in outcomes.items():
+            if not isinstance(outcome, IndexEntry.DoesNotExist):
+                resolved[query] = (conf, outcome)
+                pending.discard(query)
+
+    for query in pending:
+        resolved[query] = (conf, IndexEntry.DoesNotExist())
+    return resolved
+
+
+#: Most prefix lookups made by a single query of :py:func:`lookup_in_index`.
+PREFIX_LOOKUPS_PER_QUERY = 100
+
+
+def lookup_in_index(stems_per_content_type):
+    """
+    Look the stemmed queries up in the :py:class:`IndexEntry` table, for
+    any number of content types at once. Exact matches are preferred, the
+    stems without one fall back to STARTSWITH. More then one matching entry
+    makes the outcome :py:data:`AMBIGUOUS`. Stems which are empty, eg of
+    queries made of punctuation only, are :py:data:`UNRESOLVED`.
+
+    Makes one query for the exact matches and, if any stem is left, one for
+    the prefix matches per :py:data:`PREFIX_LOOKUPS_PER_QUERY` stems. Each
+    stem is only looked up in its own content type. Only the content type,
+    value and object id of the entries are fetched, and at most two of them
+    per prefix, so that short stems do not load the index.
+
+    :param stems_per_content_type: Dictionary mapping content type ids to
+        sets of stemmed queries.
+    :return: Dictionary mapping the same content type ids to dictionaries
+        of the outcomes, as returned by :py:meth:`SmartLinkConf._lookup`.
+    """
+    found = dict((content_type_id, {})
+                 for content_type_id in stems_per_content_type)
+    pairs = []
+    for content_type_id, stems in stems_per_content_type.items():
+        for stem in stems:
+            if stem:
+                pairs.append((content_type_id, stem))
+            else:
+                found[content_type_id][stem] = UNRESOLVED
+    if not pairs:
+        return found
+
+    entries = IndexEntry.objects.values_list(
+        'content_type', 'value', 'object_id')
+    if len(pairs) == 1:
+        # Two entries are enough to tell the match is ambiguous.
+        exact_rows = entries.filter(content_type=pairs[0][0],
+                                    value=pairs[0][1])[:2]
+    else:
+        # Each content type with its own stems, not all the stems in all
+        # the content types.
+        stems_to_query = defaultdict(list)
+        for content_type_id, stem in pairs:
+            stems_to_query[content_type_id].append(stem)
+        exact_rows = entries.filter(reduce(operator.or_, [
+            Q(content_type=content_type_id, value__in=stems)
+            for content_type_id, stems in stems_to_query.items()
+        ]))
+    exact = defaultdict(list)
+    for content_type_id, value, object_id in exact_rows:
+        exact[(content_type_id, value)].append(object_id)
+
+    remaining = []
+    for content_type_id, stem in pairs:
+        if (content_type_id, stem) in exact:
+            found[content_type_id][stem] = _single(
+                exact[(content_type_id, stem)])
+        else:
+            remaining.append((content_type_id, stem))
+
+    for start in range(0, len(remaining), PREFIX_LOOKUPS_PER_QUERY):
+        chunk = remaining[start:start + PREFIX_LOOKUPS_PER_QUERY]
+        for (content_type_id, stem), object_ids in zip(
+                chunk, _lookup_prefixes(entries, chunk)):
+            found[content_type_id][stem] = _single(object_ids)
+    return found
+
+
+def _lookup_prefixes(entries, pairs):
+    """
+    Fetch the ids of at most two objects with an entry starting with each
+    stem, in its content type.
+
+    The bounded lookups are made by a single ``UNION ALL`` query, as a
+    single ``startswith`` lookup over all the stems can not be bounded per
+    stem.
+
+    :param entries: ``values_list`` queryset of the index entries.
+    :param pairs: List of ``(content type id, stem)``.
+    :return: List of the lists of the object ids, one per pair.
+    """
+    querysets = [entries.filter(content_type=content_type_id,
+                                value__startswith=stem)[:2]
+                 for content_type_id, stem in pairs]
+    if len(querysets) == 1:
+        return [[object_id for content_type_id, value, object_id
+                 in querysets[0]]]
+
+    connection = connections[entries.db]
+    sql, params = [], []
+    for number, queryset in enumerate(querysets):
+        query_sql, query_params = queryset.query.get_compiler(
+            connection=connection).as_sql()
+        # Derived tables, as not all the databases take LIMIT in a UNION,
+        # numbered to tell which stem the rows were fetched for.
+        sql.append('SELECT %d, smartlinks_prefix_%d.* FROM (%s) '
+                   'smartlinks_prefix_%d' % (number, number, query_sql,
+                                             number))
+        params.extend(query_params)
+
+    object_ids = [[] for pair in pairs]
+    cursor = connection.cursor()
+    try:
+        cursor.execute(' UNION ALL '.join(sql), params)
+        for row in cursor.fetchall():
+            object_ids[row[0]].append(row[-1])
+    finally:
+        cursor.close()
+    return object_ids
+
+
+#: Format strings equivalent to the default templates of
+#: :py:class:`SmartLinkConf`, used by :py:meth:`SmartLinkConf.render`.
+DEFAULT_TEMPLATE_FORMATS = {
+    'template': u'<a href="%(url)s" title="%(obj)s">%(verbose_text)s</a>',
+    'unresolved_template':
+        u'<span class="smartlinks-unresolved">%(verbose_text)s</span>',
+    'model_unresolved_template':
+        u'<span class="smartlinks-unresolved">%(verbose_text)s</span>',
+    'ambiguous_template':
+        u'<span class="smartlinks-ambiguous">%(verbose_text)s</span>',
+    'disallowed_embed_template':
+        u'<span class="smartlinks-unallowed">%(smartlink_text)s</span>',
+}
+
+# Values Django localizes or calls when rendering them, left to Django.
+_LOCALIZED_TYPES = (bool, float, Decimal, datetime.date, datetime.time) + \
+    six.integer_types
+
+
+def _render_default(name, context):
+    """
+    Render the default template ``name`` using its format string.
+
+    :return: Rendered output, or ``None`` if the values are not plain enough
+        to be sure the output is the same as Django's.
+    """
+    values = dict(context)
+    if name == 'template':
+        obj = context.get('obj')
+
+        # Django would look the URL up as a key or call the object itself.
+        if obj is None or callable(obj) or hasattr(obj, '__getitem__'):
+            return None
+        try:
+            url = getattr(obj, SmartLinkConf.url_field)
+            if callable(url):
+                if getattr(url, 'alters_data', False) or getattr(
+                        url, 'do_not_call_in_templates', False):
+                    return None
+                url = url()
+        except Exception:
+            # Let Django decide whether to fail silently.
+            return None
+        values['url'] = url
+
+    escaped = {}
+    for key, value in values.items():
+        if callable(value) or isinstance(value, _LOCALIZED_TYPES):
+            return None
+        escaped[key] = conditional_escape(value)
+
+    # Missing variables render as empty strings.
+    for key in ('url', 'obj', 'verbose_text', 'smartlink_text'):
+        escaped.setdefault(key, u'')
+    return mark_safe(DEFAULT_TEMPLATE_FORMATS[name] % escaped)
+
+
+def _single(object_ids):
+    """
+    Turn the object ids of the index entries matching a stem into an
+    outcome of the lookup.
+    """
+    if not object_ids:
+        return UNRESOLVED
+    if len(object_ids) > 1:
+        return AMBIGUOUS
+    return object_ids[0]
+
+
+def _outcome(find, query):
+    """
+    Call ``find(query)``, returning the resolution exception instead of
+    raising it.
+    """
+    try:
+        return find(query)
+    except (IndexEntry.DoesNotExist, IndexEntry.MultipleObjectsReturned) as e:
+        return e
@@ -1,15 +1,26 @@
+import threading
+
 from django.core.exceptions import ValidationError
 
-from django.db.models.fields import CharField as ModelCharField
+from django.db.models import signals
+from django.db.models.fields import CharField as ModelCharField, TextField,\
+    FieldDoesNotExist
 from django.forms.fields import CharField as FormsCharField
 from django.utils.encoding import smart_unicode
 from django import forms
 from django.utils.safestring import SafeData
 from django.contrib.admin.widgets import AdminTextInputWidget
 
-from .parser import SmartEmbedParser, SmartLinkParser, Parser
+from .parser import SmartEmbedParser, SmartLinkParser, Parser,\
+    NoSmartLinkConfFoundException
+from smartlinks import IncorrectlyConfiguredSmartlinkException
 from smartlinks.models import IndexEntry
 from smartlinks.conf import smartlinks_conf
+from smartlinks.references import register_rendered_field, render_text
+
+#: Outcomes of the smartlinks resolved together for the forms being cleaned
+#: in the thread, see :py:func:`smartlinks.forms.verified_in_bulk`.
+bulk_resolution = threading.local()
 
 class SmartLinkValidator(object):
     """
@@ -38,6 +49,19 @@ class SmartLinkValidator(object):
         super(SmartLinkValidator, self).__init__()
         self.verify_exists = verify_exists
 
+    @staticmethod
+    def match(value):
+        """
+        :param value: Stripped Unicode.
+        :return: ``(parser class, match)`` for the smartlink or the
+            smartembed in the ``value``, or ``None``.
+        """
+        for parser in (SmartLinkParser, SmartEmbedParser):
+            match = parser.finder.match(value)
+            if match:
+                return parser, match
+        return None
+
     def __call__(self, value):
         value = smart_unicode(value.strip())
 
@@ -45,36 +69,70 @@ class SmartLinkValidator(object):
             # Do not attempt to verify empty links.
             return
 
-        for parser in (SmartLinkParser, SmartEmbedParser):
-            match = parser.finder.match(value)
-            if match:
-                break
-        else:
+        found = self.match(value)
+        if found is None:
             raise ValidationError(self.message)
+        parser, match = found
 
         if self.verify_exists:
+            link_parser = parser(smartlinks_conf)
+
+            # Resolved together with the other smartlinks of the form or
+            # formset, if it is being verified in bulk.
+            resolved = getattr(bulk_resolution, 'resolved', None)
+            if resolved is not None:
+                link_parser._resolved = resolved
 
             # Early return from ``Parser`` class indicates that
             # there were errors during smartlink resolution.
-            if Parser.parse(parser(smartlinks_conf), match):
+            if Parser.parse(link_parser, match):
                 raise ValidationError(self.unresolved_message)
 
 
 class SmartLink(object):
     """
     Wrapper for the smartlink data.
+
+    The wrapper is created once per instance and field (see
+    :py:class:`SmartLinkDescriptor`), and the object the smartlink resolves
+    to, its URL and the rendered link are computed once, until the raw
+    smartlink is set again.
     """
     def __init__(self, instance, field_name):
         self.instance = instance
         self.field_name = field_name
         self.parser = SmartLinkParser(smartlinks_conf)
 
+        # Outcomes computed from the raw smartlink, by name.
+        self._memo = {}
+
+    def __getstate__(self):
+        # The parser and the outcomes are not worth pickling.
+        return {'instance': self.instance, 'field_name': self.field_name}
+
+    def __setstate__(self, state):
+        self.__init__(state['instance'], state['field_name'])
+
+    def invalidate(self):
+        """
+        Forget the outcomes computed from the raw smartlink, done whenever
+        it is set.
+        """
+        self._memo.clear()
+        self.parser._resolved.clear()
+
+    def _memoised(self, name, compute):
+        if name not in self._memo:
+            self._memo[name] = compute()
+        return self._memo[name]
+
     @property
     def verbose_text(self):
         """
         :return: Verbose text for the smartlink.
         """
-        return self.parser.get_smartlink_text(self.raw)
+        return self._memoised('verbose_text', lambda:
+                              self.parser.get_smartlink_text(self.raw))
 
     def _get_raw(self):
         return (self.instance.__dict__[self.field_name] or '')
@@ -92,11 +150,13 @@ class SmartLink(object):
         or empty string if it is unresolved.
         :rtype: unicode
         """
+        return self._memoised('url', self._get_url)
+
+    def _get_url(self):
         obj = self.object
         if obj is None:
             return u""
-        # Calling ``self.object`` sets ``self.parser.conf``.
-        conf = self.parser.conf
+        conf = self._memo['conf']
         url = getattr(obj, conf.url_field, u"")
         return url() if callable(url) else url
 
@@ -106,11 +166,39 @@ class SmartLink(object):
         :return: Object the smartlink is pointing to
         or ``None`` if it is unresolved.
         """
+        return self._memoised('object', self._get_object)
+
+    def _get_object(self):
+        match = self.parser.finder.match(self.raw)
+        if match is None:
+            return None
         try:
-            return self.parser.get_smartlinked_object(self.raw)
-        except (IndexEntry.DoesNotExist,
-                IndexEntry.MultipleObjectsReturned):
+            outcome = self.parser._find_object(match)
+        except NoSmartLinkConfFoundException:
             return None
+        except (IndexEntry.DoesNotExist,
+                IndexEntry.MultipleObjectsReturned) as e:
+            outcome = e
+        return self._set_outcome(match, self.parser.conf, outcome)
+
+    def _set_outcome(self, match, conf, outcome):
+        """
+        Remember the outcome of the resolution of the smartlink, also for
+        rendering the link.
+
+        :param match: Match of the raw smartlink.
+        :param conf: Configuration the smartlink resolved in.
+        :param outcome: Object found, or the exception raised.
+        :return: Object found or ``None``.
+        """
+        obj = None if isinstance(outcome, Exception) else outcome
+        self.parser.conf = conf
+        self.parser._resolved[(match.group("ModelName") or None,
+                               match.group("Query").strip())] = (
+            conf, outcome)
+        self._memo['conf'] = conf
+        self._memo['object'] = obj
+        return obj
 
     @property
     def rendered_link(self):
@@ -118,6 +206,11 @@ class SmartLink(object):
         :return: rendered ``<a href='...'>...</a>`` tag.
         :rtype: SafeString
         """
+        return self._memoised('rendered_link', self._get_rendered_link)
+
+    def _get_rendered_link(self):
+        # Resolves the smartlink only once for both.
+        self.object
         return self.parser.process_smartlinks(self.raw)
 
     def __unicode__(self):
@@ -130,22 +223,78 @@ class SmartLink(object):
         return len(self.raw)
 
 class SmartLinkDescriptor(object):
+    """
+    Descriptor returning the :py:class:`SmartLink` wrapper of the field,
+    the same one on every access for an instance.
+    """
     def __init__(self, field):
         self.field = field
 
+        # Key of the wrapper in the ``__dict__`` of the instances.
+        self.cache_name = '_%s_smartlink' % field.name
+
     def __get__(self, instance, owner):
         if instance is None:
             raise AttributeError('Can only be accessed via an instance.')
         smartlink = instance.__dict__[self.field.name]
         if smartlink is None:
             return None
-        return SmartLink(instance, self.field.name)
+        cached = instance.__dict__.get(self.cache_name)
+
+        # Copies of the instance share its ``__dict__`` entries.
+        if cached is None or cached.instance is not instance:
+            cached = SmartLink(instance, self.field.name)
+            instance.__dict__[self.cache_name] = cached
+        return cached
 
     def __set__(self, obj, value):
         if isinstance(value, SmartLink):
             obj.__dict__[self.field.name] = value.raw
         else:
             obj.__dict__[self.field.name] = value
+        if self.cache_name in obj.__dict__:
+            obj.__dict__[self.cache_name].invalidate()
+
+
+def prefetch_smartlinks(instances, *field_names):
+    """
+    Resolve the smartlinks in the ``field_names`` of all the ``instances``
+    together, so that a list of objects with a :py:class:`SmartLinkField`
+    does not look up each one separately::
+
+        quotes = prefetch_smartlinks(Quote.objects.all(), 'link')
+
+    The smartlinks are resolved by
+    :py:meth:`smartlinks.parser.Parser.resolve_in_bulk`, with one index
+    lookup per content type, and the outcomes are handed to the
+    :py:class:`SmartLink` wrappers of the instances, whose ``object``,
+    ``url`` and ``rendered_link`` then make no queries to resolve.
+
+    :param instances: Queryset or iterable of model instances.
+    :param field_names: Names of the :py:class:`SmartLinkField` fields.
+    :return: List of the instances.
+    """
+    instances = list(instances)
+    parser = SmartLinkParser(smartlinks_conf)
+    links = []
+    for instance in instances:
+        for field_name in field_names:
+            link = getattr(instance, field_name)
+            if link is None or 'object' in link._memo:
+                continue
+            match = parser.finder.match(link.raw)
+            if match is not None:
+                links.append((link, match))
+
+    parser.resolve_in_bulk([match for link, match in links])
+    for link, match in links:
+        key = (match.group("ModelName") or None,
+               match.group("Query").strip())
+
+        # Smartlinks to models not configured are left to fail on access.
+        if key in parser._resolved:
+            link._set_outcome(match, *parser._resolved[key])
+    return instances
 
 
 class SmartLinkField(ModelCharField):
@@ -172,6 +321,8 @@ class SmartLinkField(ModelCharField):
         u'<a alt="scar face" href="/movies/scar-face-2">Scar Face</a>'
         >>> q.link.object
         <Movie: Scar Face>
+
+    For lists of objects, see :py:func:`prefetch_smartlinks`.
     """
 
     def __init__(self, verify_exists=False,
@@ -231,6 +382,78 @@ class SmartLinkField(ModelCharField):
         return (field_class, args, kwargs)
 
 
+class RenderedSmartTextField(TextField):
+    """
+    Model field storing the text of another field with the smartlinks and
+    smartembeds rendered, as by the ``smartlinks`` template filter, so that
+    reading it costs no resolution at all::
+
+        class Page(models.Model):
+            body = models.TextField()
+            body_html = RenderedSmartTextField(source='body')
+
+    ``{{ page.body_html }}`` is then enough in the templates.
+
+    The text is rendered on every save. The smartlinks in the ``source``
+    field are recorded in the reverse index (see
+    :py:func:`smartlinks.register_link_source`), and when the index entries
+    of a smartlinked object are added or removed, only the rows with
+    smartlinks which might now resolve differently are rendered again, in
+    chunks, see :py:func:`smartlinks.references.rerender_dependents`.
+
+    Changes of the linked objects which leave their index entries as they
+    were, eg of the URL, are not picked up; call
+    ``rerender_dependents((), obj)`` for those.
+    """
+
+    def __init__(self, source, *args, **kwargs):
+        """
+        :param source: Name of the field with the raw text, a text field or
+            a :py:class:`SmartLinkField`.
+        """
+        self.source = source
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('blank', True)
+        super(RenderedSmartTextField, self).__init__(*args, **kwargs)
+
+    def contribute_to_class(self, cls, name):
+        super(RenderedSmartTextField, self).contribute_to_class(cls, name)
+        if not cls._meta.abstract:
+            signals.class_prepared.connect(self._register, sender=cls,
+                                           weak=False)
+
+    def _register(self, sender, **kwargs):
+        # Only the fields of the model itself can be looked at, the app
+        # registry is still loading the other models.
+        try:
+            sender._meta.get_field(self.source)
+        except FieldDoesNotExist:
+            raise IncorrectlyConfiguredSmartlinkException(
+                "Source '%s' of the rendered field '%s' is not a field of "
+                "model '%s'" % (self.source, self.name, sender))
+        register_rendered_field(sender, self.name, self.source)
+
+    def pre_save(self, model_instance, add):
+        value = render_text(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(
+            RenderedSmartTextField, self).deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def south_field_triple(self):
+        """
+        Return a suitable description of this field for South.
+        """
+        from south.modelsinspector import introspector
+        field_class = 'django.db.models.TextField'
+        args, kwargs = introspector(self)
+        return (field_class, args, kwargs)
+
+
 class SmartLinkWidget(AdminTextInputWidget):
     """
     Custom descriptors require custom classes.
@@ -273,6 +496,7 @@ class SmartLinkFormField(FormsCharField):
                                              min_length,
                                              *args,
                                              **kw)
+        self.verify_exists = verify_exists
         self.validators.append(SmartLinkValidator(verify_exists))
 
     def to_python(self, value):
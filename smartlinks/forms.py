@@ -0,0 +1,122 @@
+"""
+Forms and formsets verifying all their smartlinks at once.
+
+Each :py:class:`smartlinks.fields.SmartLinkFormField` with ``verify_exists``
+resolves its smartlink when it is cleaned, so a formset with dozens of them
+makes dozens of lookups. The formsets below resolve the smartlinks of all
+their forms in bulk before cleaning them, the errors are still reported by
+each field.
+
+.. highlight:: python
+
+For the inlines and the ``list_editable`` changelists of the admin::
+
+    class QuoteInline(admin.TabularInline):
+        model = Quote
+        formset = SmartLinkInlineFormSet
+
+    class QuoteAdmin(admin.ModelAdmin):
+        list_editable = ('link',)
+
+        def get_changelist_formset(self, request, **kwargs):
+            kwargs['formset'] = SmartLinkModelFormSet
+            return super(QuoteAdmin, self).get_changelist_formset(
+                request, **kwargs)
+"""
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.forms.formsets import BaseFormSet
+from django.forms.models import BaseModelFormSet, BaseInlineFormSet
+from django.utils.encoding import smart_unicode
+
+from smartlinks.conf import smartlinks_conf
+from smartlinks.fields import SmartLinkFormField, SmartLinkValidator,\
+    bulk_resolution
+from smartlinks.parser import Parser
+
+
+@contextmanager
+def verified_in_bulk(forms):
+    """
+    Context manager resolving the smartlinks to be verified in the bound
+    ``forms`` together, for the validators of the fields to use while the
+    forms are cleaned inside it::
+
+        with verified_in_bulk(forms):
+            valid = all([form.is_valid() for form in forms])
+
+    :param forms: Iterable of forms.
+    """
+    resolved = getattr(bulk_resolution, 'resolved', None)
+    parser = Parser(smartlinks_conf)
+    parser.resolve_in_bulk([
+        match for match in _pending_matches(forms)
+        if resolved is None or (match.group("ModelName") or None,
+                                match.group("Query").strip()) not in resolved
+    ])
+
+    # Nested inside another bulk verification, eg of the whole formset.
+    if resolved is not None:
+        resolved.update(parser._resolved)
+        yield
+        return
+
+    bulk_resolution.resolved = parser._resolved
+    try:
+        yield
+    finally:
+        del bulk_resolution.resolved
+
+
+def _pending_matches(forms):
+    """
+    Iterate over the matches of the smartlinks the ``forms`` will verify.
+    """
+    for form in forms:
+        if not form.is_bound:
+            continue
+        for name, field in form.fields.items():
+            if (not isinstance(field, SmartLinkFormField)
+                    or not field.verify_exists):
+                continue
+            try:
+                value = field.to_python(field.widget.value_from_datadict(
+                    form.data, form.files, form.add_prefix(name)))
+            except ValidationError:
+                continue
+            found = SmartLinkValidator.match(smart_unicode(value.strip()))
+            if found is not None:
+                yield found[1]
+
+
+class SmartLinkFormMixin(object):
+    """
+    Form mixin verifying the smartlinks of all the fields in bulk.
+    """
+
+    def full_clean(self):
+        with verified_in_bulk([self]):
+            super(SmartLinkFormMixin, self).full_clean()
+
+
+class SmartLinkFormSetMixin(object):
+    """
+    Formset mixin verifying the smartlinks of all the forms in bulk.
+    """
+
+    def full_clean(self):
+        with verified_in_bulk(self.forms):
+            super(SmartLinkFormSetMixin, self).full_clean()
+
+
+class SmartLinkFormSet(SmartLinkFormSetMixin, BaseFormSet):
+    pass
+
+
+class SmartLinkModelFormSet(SmartLinkFormSetMixin, BaseModelFormSet):
+    pass
+
+
+class SmartLinkInlineFormSet(SmartLinkFormSetMixin, BaseInlineFormSet):
+    pass
@@ -1,23 +1,176 @@
+from multiprocessing import Pool
+from optparse import make_option
+import time
+
+from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
 
-from smartlinks import smartlinks_conf
+from smartlinks.conf import smartlinks_conf
 from smartlinks.models import IndexEntry
 
 class Command(BaseCommand):
     can_import_settings = False
+    leave_locale_alone = True
     requires_model_validation = False
 
     help = """Reset the index for smartlinks."""
 
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+            default=None,
+            help='Number of instances fetched and indexed at a time.'),
+        make_option('--workers', dest='workers', type='int', default=1,
+            help='Number of processes computing the index entries.'),
+    )
+
     def handle(self, *args, **options):
-        recreate_index()
+        start = time.time()
+        stats = recreate_index(options.get('chunk_size'),
+                               options.get('workers') or 1)
+        seconds = time.time() - start
+
+        verbosity = int(options.get('verbosity', 1))
+        if verbosity > 1:
+            for conf, rows, conf_seconds in stats:
+                self.stdout.write(u"%s: %s" % (
+                    _conf_name(conf), _throughput(rows, conf_seconds)))
+        if verbosity > 0:
+            self.stdout.write(u"Index reset: %s" % _throughput(
+                sum(rows for conf, rows, conf_seconds in stats), seconds))
 
-def recreate_index():
+def recreate_index(chunk_size=None, workers=1):
+    """
+    :param chunk_size: See :py:meth:`SmartLinkConf.recreate_index`.
+    :param workers: If more then one, the index entries are computed by
+        that many processes, see :py:func:`recreate_index_in_parallel`.
+    :return: List of ``(conf, index entries created, seconds taken)``.
+    """
     IndexEntry.objects.all().delete()
-    seen = []
-    for conf in smartlinks_conf.values():
-        if conf in seen: continue
-        seen.append(conf)
+    if workers > 1:
+        return recreate_index_in_parallel(chunk_size, workers)
 
+    stats = []
+    for conf in _unique_confs():
         # Generate index entries for corresponding items.
-        conf.recreate_index()
\ No newline at end of file
+        start = time.time()
+        rows = conf.recreate_index(chunk_size)
+        stats.append((conf, rows, time.time() - start))
+    return stats
+
+def recreate_index_in_parallel(chunk_size, workers):
+    """
+    Re-create the index using a pool of ``workers`` processes. The work is
+    split by configuration and by ranges of ``chunk_size`` primary keys,
+    the processes compute the search strings for their range and all the
+    writes are done by the calling process, with one ``bulk_create`` per
+    range.
+
+    Assumes the index is empty.
+
+    :return: Same as :py:func:`recreate_index`, with the time spent writing
+        the entries of each configuration.
+    """
+    confs = _unique_confs()
+    ranges = [
+        (conf_index, first_pk, last_pk)
+        for conf_index, conf in enumerate(confs)
+        if conf.get_queryset() is not None
+        for first_pk, last_pk in _pk_ranges(conf, chunk_size)
+    ]
+
+    # The processes have to open their own connections, a connection shared
+    # across a fork is corrupted by concurrent use. Except for an in-memory
+    # SQLite database (eg in tests), only reachable through the inherited
+    # connection, which the processes are only reading from.
+    for connection in connections.all():
+        if not _is_in_memory(connection):
+            connection.close()
+
+    rows = [0] * len(confs)
+    seconds = [0.0] * len(confs)
+    pool = Pool(workers)
+    try:
+        for conf_index, content_type_id, entries in pool.imap_unordered(
+                _get_index_entries, ranges):
+            start = time.time()
+            with transaction.atomic():
+                IndexEntry.objects.bulk_create([
+                    IndexEntry(value=value,
+                               content_type_id=content_type_id,
+                               object_id=object_id)
+                    for value, object_id in entries
+                ])
+            rows[conf_index] += len(entries)
+            seconds[conf_index] += time.time() - start
+    finally:
+        pool.terminate()
+        pool.join()
+
+    for conf in confs:
+        if conf.get_queryset() is not None:
+            conf.index_changed(
+                ContentType.objects.get_for_model(conf.resolve_model()),
+                reloaded=True)
+    return list(zip(confs, rows, seconds))
+
+def _get_index_entries(work):
+    """
+    Compute the index entries for a range of primary keys, in a worker process.
+
+    :param work: ``(configuration index, first pk, last pk)``.
+    :return: ``(configuration index, content type id, [(value, object id)])``.
+    """
+    conf_index, first_pk, last_pk = work
+    conf = _unique_confs()[conf_index]
+    content_type = ContentType.objects.get_for_model(conf.resolve_model())
+    entries = [
+        (search_string, instance.pk)
+        for instance in conf.get_queryset().filter(pk__gte=first_pk,
+                                                   pk__lte=last_pk)
+        for search_string in conf._get_search_strings_for_index(instance)
+    ]
+    return conf_index, content_type.pk, entries
+
+def _pk_ranges(conf, chunk_size):
+    """
+    Split the queryset of ``conf`` into ``(first pk, last pk)`` ranges of
+    ``chunk_size`` instances, fetching only the primary keys.
+    """
+    chunk_size = chunk_size or conf.index_chunk_size
+    pks = conf.get_queryset().order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        if last_pk is not None:
+            chunk = list(pks.filter(pk__gt=last_pk)[:chunk_size])
+        else:
+            chunk = list(pks[:chunk_size])
+        if not chunk:
+            return
+        yield chunk[0], chunk[-1]
+        last_pk = chunk[-1]
+
+def _unique_confs():
+    """
+    :return: Configurations in the registration order, each one once.
+    """
+    seen = set()
+    confs = []
+    for conf in smartlinks_conf.values():
+        if conf not in seen:
+            seen.add(conf)
+            confs.append(conf)
+    return confs
+
+def _is_in_memory(connection):
+    name = connection.settings_dict['NAME']
+    return connection.vendor == 'sqlite' and (
+        not name or name == ':memory:' or 'mode=memory' in name)
+
+def _conf_name(conf):
+    model = conf.resolve_model()
+    return model.__name__ if model else conf.__class__.__name__
+
+def _throughput(rows, seconds):
+    return u"%d rows in %.2fs (%d rows/s)" % (
+        rows, seconds, rows / seconds if seconds else 0)
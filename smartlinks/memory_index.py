@@ -0,0 +1,87 @@
+"""
+In-memory copy of the smartlink index for one content type.
+"""
+from bisect import bisect_left, bisect_right
+import threading
+
+
+class MemoryIndex(object):
+    """
+    Index entries of one content type kept in memory as two parallel
+    arrays, stemmed values sorted together with the object ids, plus the
+    values of each object for the updates. Both the exact and the prefix
+    lookups are binary searches, no database queries are made.
+
+    Used by :py:class:`smartlinks.conf.SmartLinkConf` when its
+    ``memory_index`` attribute is set. See :ref:`memory-index` for the memory
+    it takes and the lookup latency.
+    """
+
+    def __init__(self, entries=()):
+        """
+        :param entries: Iterable of ``(value, object id)`` pairs.
+        """
+        entries = sorted(entries)
+        self._values = [value for value, object_id in entries]
+        self._ids = [object_id for value, object_id in entries]
+        self._by_object = {}
+        for value, object_id in entries:
+            self._by_object[object_id] = self._by_object.get(
+                object_id, ()) + (value,)
+        self._lock = threading.Lock()
+
+    def find(self, stem):
+        """
+        Find the object ids for the stemmed query, exact matches first and
+        if there are none the ones starting with the ``stem``.
+
+        :return: Tuple of at most two object ids, two meaning the result
+            is ambiguous.
+        """
+        with self._lock:
+            start = bisect_left(self._values, stem)
+            end = bisect_right(self._values, stem, start)
+            if end > start:
+                return tuple(self._ids[start:min(end, start + 2)])
+
+            # Values starting with the stem are sorted right after it.
+            found = []
+            for position in range(start, min(start + 2, len(self._values))):
+                if not self._values[position].startswith(stem):
+                    break
+                found.append(self._ids[position])
+            return tuple(found)
+
+    def set_object(self, object_id, values):
+        """
+        Replace the values for the object.
+        """
+        values = tuple(set(values))
+        with self._lock:
+            self._remove(object_id)
+            for value in values:
+                position = bisect_right(self._values, value)
+                self._values.insert(position, value)
+                self._ids.insert(position, object_id)
+            if values:
+                self._by_object[object_id] = values
+
+    def remove_object(self, object_id):
+        """
+        Remove all the values for the object.
+        """
+        with self._lock:
+            self._remove(object_id)
+
+    def __len__(self):
+        return len(self._values)
+
+    def _remove(self, object_id):
+        for value in self._by_object.pop(object_id, ()):
+            start = bisect_left(self._values, value)
+            end = bisect_right(self._values, value, start)
+            for position in range(start, end):
+                if self._ids[position] == object_id:
+                    del self._values[position]
+                    del self._ids[position]
+                    break
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'LinkReference'
+        db.create_table('smartlinks_linkreference', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('value', self.gf('django.db.models.fields.CharField')(max_length=300, db_index=True)),
+            ('target_content_type', self.gf('django.db.models.fields.related.ForeignKey')(related_name='smartlink_references_to+', null=True, to=orm['contenttypes.ContentType'])),
+            ('target_object_id', self.gf('django.db.models.fields.PositiveIntegerField')(null=True)),
+            ('source_content_type', self.gf('django.db.models.fields.related.ForeignKey')(related_name='smartlink_references_from+', to=orm['contenttypes.ContentType'])),
+            ('source_object_id', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('field', self.gf('django.db.models.fields.CharField')(max_length=100)),
+        ))
+        db.send_create_signal('smartlinks', ['LinkReference'])
+
+        # Adding index on 'LinkReference', fields ['target_content_type', 'target_object_id']
+        db.create_index('smartlinks_linkreference', ['target_content_type_id', 'target_object_id'])
+
+        # Adding index on 'LinkReference', fields ['source_content_type', 'source_object_id']
+        db.create_index('smartlinks_linkreference', ['source_content_type_id', 'source_object_id'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'LinkReference', fields ['source_content_type', 'source_object_id']
+        db.delete_index('smartlinks_linkreference', ['source_content_type_id', 'source_object_id'])
+
+        # Removing index on 'LinkReference', fields ['target_content_type', 'target_object_id']
+        db.delete_index('smartlinks_linkreference', ['target_content_type_id', 'target_object_id'])
+
+        # Deleting model 'LinkReference'
+        db.delete_table('smartlinks_linkreference')
+
+
+    models = {
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'smartlinks.customsmartlink': {
+            'Meta': {'object_name': 'CustomSmartLink'},
+            'description': ('django.db.models.fields.TextField', [], {'max_length': '1000', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'shortcuts': ('django.db.models.fields.TextField', [], {'max_length': '300'}),
+            'url': ('django.db.models.fields.CharField', [], {'max_length': '300'})
+        },
+        'smartlinks.indexentry': {
+            'Meta': {'unique_together': "(('value', 'content_type', 'object_id'),)", 'object_name': 'IndexEntry'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '300', 'db_index': 'True'})
+        },
+        'smartlinks.linkreference': {
+            'Meta': {'object_name': 'LinkReference', 'index_together': "(('target_content_type', 'target_object_id'), ('source_content_type', 'source_object_id'))"},
+            'field': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'source_content_type': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'smartlink_references_from+'", 'to': "orm['contenttypes.ContentType']"}),
+            'source_object_id': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'target_content_type': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'smartlink_references_to+'", 'null': 'True', 'to': "orm['contenttypes.ContentType']"}),
+            'target_object_id': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True'}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '300', 'db_index': 'True'})
+        }
+    }
+
+    complete_apps = ['smartlinks']
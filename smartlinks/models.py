@@ -97,6 +97,45 @@ class IndexEntry(models.Model):
     class Meta:
         unique_together = (("value", "content_type", "object_id",),)
 
+class LinkReference(models.Model):
+    """
+    Reverse index of the smartlinks: one entry per smartlink in the text
+    fields of the models registered with
+    :py:func:`smartlinks.register_link_source`, recording the object the
+    smartlink resolved to when the text was saved.
+
+    It answers "what links here", so that when an object is renamed or
+    deleted only the pages linking to it have to be re-rendered or flushed
+    from the cache, see :py:mod:`smartlinks.references`.
+
+    Smartlinks which did not resolve have no ``target_object_id``, and no
+    ``target_content_type`` either unless the model name was given.
+    """
+
+    # Stemmed query of the smartlink.
+    value = models.CharField(db_index=True, max_length=INDEX_ENTRY_LEN)
+
+    # Object the smartlink resolved to.
+    target_content_type = models.ForeignKey(
+        ContentType, null=True, related_name='smartlink_references_to+')
+    target_object_id = models.PositiveIntegerField(null=True)
+
+    # Object and field containing the smartlink.
+    source_content_type = models.ForeignKey(
+        ContentType, related_name='smartlink_references_from+')
+    source_object_id = models.PositiveIntegerField()
+    field = models.CharField(max_length=100)
+
+    def __unicode__(self):
+        return "'%s' in (%s-%s).%s" % (self.value, self.source_content_type,
+                                       self.source_object_id, self.field)
+
+    class Meta:
+        index_together = (
+            ("target_content_type", "target_object_id"),
+            ("source_content_type", "source_object_id"),
+        )
+
 class CustomSmartLink(models.Model):
     """
     Model which allows user to put in their own smartlinks.
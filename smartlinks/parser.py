@@ -1,9 +1,10 @@
-import re
+from itertools import islice
 
 from django.utils.safestring import mark_safe
-from django.template.context import Context
 
+from smartlinks.conf import find_objects_in_confs
 from smartlinks.models import IndexEntry
+from smartlinks.scanner import LinkFinder, EmbedFinder, scan
 
 class Parser(object):
     """
@@ -13,8 +14,18 @@ class Parser(object):
     # To be overridden by subclasses.
     finder = None
 
-    def __init__(self, smartlinks_conf):
+    def __init__(self, smartlinks_conf, batch=False):
+        """
+        :param batch: If set to ``True``, :py:meth:`process_smartlinks`
+        resolves all the smartlinks in the text at once before rendering
+        them, see :py:meth:`resolve_in_bulk`.
+        """
         self.smartlinks_conf = smartlinks_conf
+        self.batch = batch
+
+        # Outcomes of the bulk resolution, maps ``(ModelName, Query)`` to
+        # ``(conf, object or exception)``.
+        self._resolved = {}
 
     def process_smartlinks(self, value):
         """
@@ -23,7 +34,134 @@ class Parser(object):
 
         Replace the smartlinks with their values inside the text.
         """
-        return mark_safe(self.finder.sub(self.parse, value))
+        if not self.batch:
+            return mark_safe(self.finder.sub(self.parse, value))
+
+        # Text is scanned only once, all smartlinks are resolved together
+        # and only then substituted.
+        return mark_safe(u"".join(self.iter_smartlinks(value, window=None)))
+
+    def iter_smartlinks(self, value, window=100):
+        """
+        :param value: Str or Unicode.
+        :param window: Number of smartlinks resolved together, ``None`` for
+            all the smartlinks in the text.
+
+        Generator of the rendered text, chunk by chunk, in the same way as
+        :py:meth:`process_smartlinks` in the batch mode. The smartlinks are
+        resolved in bulk a window at a time, and the chunks of a window are
+        yielded before the next one is looked up, so the whole output is
+        never held in memory. Can be passed to ``StreamingHttpResponse``::
+
+            parser = SmartTextParser(smartlinks_conf)
+            return StreamingHttpResponse(parser.iter_smartlinks(transcript))
+        """
+        tokens = self.tokenize(value)
+        position = 0
+        while True:
+            window_tokens = list(islice(tokens, window))
+            if not window_tokens:
+                break
+
+            self.resolve_in_bulk([match for parser, match in window_tokens])
+            try:
+                for parser, match in window_tokens:
+                    if match.start() > position:
+                        yield value[position:match.start()]
+                    yield parser.parse(match)
+                    position = match.end()
+            finally:
+                self._resolved.clear()
+
+        if position < len(value):
+            yield value[position:]
+
+    def process_many(self, values):
+        """
+        :param values: Iterable of Str or Unicode.
+        :return: List of SafeStrings.
+
+        Replace the smartlinks inside many texts at once, resolving all of
+        them together with :py:meth:`resolve_in_bulk`, so that the number of
+        queries does not depend on the number of texts.
+
+        The ORM of the supported Django versions is synchronous only; from an
+        async view, render all the texts of a response with a single call::
+
+            parser = SmartTextParser(smartlinks_conf)
+            bodies = await sync_to_async(parser.process_many)(texts)
+        """
+        tokens = [(value, list(self.tokenize(value))) for value in values]
+        self.resolve_in_bulk([match for value, value_tokens in tokens
+                              for parser, match in value_tokens])
+        try:
+            rendered = []
+            for value, value_tokens in tokens:
+                output = []
+                position = 0
+                for parser, match in value_tokens:
+                    output.append(value[position:match.start()])
+                    output.append(parser.parse(match))
+                    position = match.end()
+                output.append(value[position:])
+                rendered.append(mark_safe(u"".join(output)))
+        finally:
+            self._resolved.clear()
+        return rendered
+
+    def tokenize(self, value):
+        """
+        :param value: Str or Unicode.
+
+        Iterate over the smartlinks in the text, in order, as
+        ``(parser, match)`` tuples.
+        """
+        for match in self.finder.finditer(value):
+            yield self, match
+
+    def resolve_in_bulk(self, matches):
+        """
+        :param matches: Iterable of regexp match objects.
+
+        Resolve the smartlinks for all the ``matches`` at once, so that
+        :py:meth:`parse` does not have to look up each one separately.
+
+        Smartlinks with the model name specified are resolved using one
+        :py:meth:`SmartLinkConf.find_objects` call per configuration,
+        the ones without it all together by
+        :py:func:`smartlinks.conf.find_objects_in_confs`, exactly as
+        :py:meth:`_find_object` does.
+        """
+        self._resolved.clear()
+        if not self.smartlinks_conf:
+            return
+
+        typed = {}
+        untyped = set()
+        for match in matches:
+            model = match.group("ModelName")
+            query = match.group("Query").strip()
+            if not model:
+                untyped.add(query)
+            elif model in self.smartlinks_conf:
+                typed.setdefault(model, set()).add(query)
+
+        # Shortcuts pointing to the same configuration share the lookup.
+        queries_per_conf = {}
+        for model, queries in typed.items():
+            queries_per_conf.setdefault(self.smartlinks_conf[model],
+                                        set()).update(queries)
+        outcomes = dict((conf, conf.find_objects(queries))
+                        for conf, queries in queries_per_conf.items())
+        for model, queries in typed.items():
+            conf = self.smartlinks_conf[model]
+            for query in queries:
+                self._resolved[(model, query)] = (conf, outcomes[conf][query])
+
+        if untyped:
+            for query, resolved in find_objects_in_confs(
+                    self._unique_confs(), untyped).items():
+                self._resolved[(None, query)] = resolved
 
     def get_smartlinked_object(self, value):
         """
@@ -82,25 +220,21 @@ class Parser(object):
 
             return self.smartlinks_conf.values()[
                    0
-            ].model_unresolved_template.render(Context({
+            ].render('model_unresolved_template', {
                 'smartlink_text': match.group(0),
                 'verbose_text': verbose_text,
                 'query': query
-            }))
+            })
 
         except IndexEntry.DoesNotExist:
-            return self.conf.unresolved_template.render(
-                Context(dict(
-                    verbose_text=verbose_text
-                ))
-            )
+            return self.conf.render('unresolved_template', dict(
+                verbose_text=verbose_text
+            ))
 
         except IndexEntry.MultipleObjectsReturned:
-            return self.conf.ambiguous_template.render(
-                Context(dict(
-                    verbose_text=verbose_text
-                ))
-            )
+            return self.conf.render('ambiguous_template', dict(
+                verbose_text=verbose_text
+            ))
 
         self.verbose_text = verbose_text
 
@@ -129,45 +263,43 @@ class Parser(object):
             # Show that the conf is not found.
             raise NoSmartLinkConfFoundException()
 
+        # Already resolved by ``self.resolve_in_bulk``.
+        if (model or None, query) in self._resolved:
+            self.conf, outcome = self._resolved[(model or None, query)]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
         if model:
             self.conf = self.smartlinks_conf[model]
             return self.conf.find_object(query)
 
-        else:
-            # Model is not specified, let's try to find it.
-            # Note that because we are using OrderedDict all models
-            # are tried in the specified order.
+        # Model is not specified, let's try to find it.
+        # Note that because we are using OrderedDict all models
+        # are tried in the specified order.
+        self.conf, outcome = find_objects_in_confs(
+            self._unique_confs(), [query])[query]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
 
-            seen = []
-            for self.conf in self.smartlinks_conf.values():
-
-                # Many configuration occur in .values()
-                # multiple times.
-                if self.conf in seen:
-                    continue
-                seen.append(self.conf)
-                try:
-                    return self.conf.find_object(query)
-                except IndexEntry.DoesNotExist:
-                    continue
-
-        # If we have not returned yet, it means that the object does not exist.
-        raise IndexEntry.DoesNotExist()
+    def _unique_confs(self):
+        """
+        :return: Configurations in the registration order, each one once,
+        even if it is registered under several shortcuts.
+        """
+        seen = set()
+        confs = []
+        for conf in self.smartlinks_conf.values():
+            if conf not in seen:
+                seen.add(conf)
+                confs.append(conf)
+        return confs
 
 class SmartLinkParser(Parser):
-    finder = re.compile(r"""
-        (?<![\\])    # do NOT match smartlinks preceded by a slash
-        \[\[
-            \s*
-            ((?P<ModelName>\w+)\s*\->)?    # Optional model name at the start
-                                        # [[ Event->Mad Max ]]
-                                        # vs [[ Movie->Mad Max ]]
-            (?P<Query>[^\]\|]+)
-            
-            (\|(?P<VerboseText>[^\]]+))?
-            \s*
-        \]\]
-    """, re.VERBOSE)
+    # [[ Mad Max ]], [[ Event->Mad Max ]] or [[ Mad Max | the movie ]],
+    # not matched if preceded by a slash.
+    finder = LinkFinder()
 
 
     def parse(self, match):
@@ -181,38 +313,17 @@ class SmartLinkParser(Parser):
             obj=self.obj,
         )
 
-        return self.conf.template.render(Context(context))
+        return self.conf.render('template', context)
 
 
 class SmartEmbedParser(Parser):
-    finder = re.compile(r"""
-        (?<![\\])    # do NOT match smartlinks preceded by a slash
-        \{\{
-            \s*
-            ((?P<ModelName>\w+)\s*\->)?  # Optional model name at the start
-            (?P<Query>[^\]\|]+)
-            \|\s*(?P<AttrName>\w+) # Attribute we are getting
-                                 # from the object.
-                                 # eg {{ Mad max | Image }}
-                                 # or {{ Mad max | Video }}
-
-            (?P<Options>         # Options passed to the attribute
-              (\s*\|\s*
-
-              ((\w+\s*=\s*\w+) | (\w+))
-                                    # {{ Event->Siesta | Image | 300 | My image }}
-                                    # Named options can be used as well
-                                    # {{ Siesta | Image | size=300 |
-                                    #    caption=My image }}
-                                    # Combination of named and unnamed options
-                                    # is also acceptable:
-                                    # {{ Siesta | Image | size=300 | My image }}
-
-              )+
-            )?
-            \s*
-        \}\}
-    """, re.VERBOSE)
+    # Attribute of the object, eg {{ Mad max | Image }}, with options:
+    # {{ Event->Siesta | Image | 300 | My image }}
+    # Named options can be used as well
+    # {{ Siesta | Image | size=300 | caption=My image }}
+    # Combination of named and unnamed options is also acceptable:
+    # {{ Siesta | Image | size=300 | My image }}
+    finder = EmbedFinder()
 
     def parse(self, match):
         ret = super(SmartEmbedParser, self).parse(match)
@@ -224,9 +335,9 @@ class SmartEmbedParser(Parser):
         # Due to security reasons only the attributes specified in
         # 'embeddable_attributes' tuple can be accessed using the smartlink.
         if not attr in self.conf.embeddable_attributes:
-            return self.conf.disallowed_embed_template.render(Context({
+            return self.conf.render('disallowed_embed_template', {
                 'smartlink_text': match.group(0)
-            }))
+            })
 
         options = match.group("Options")
 
@@ -246,5 +357,64 @@ class SmartEmbedParser(Parser):
 
         return getattr(self.obj, attr)(*args, **kwargs)
 
+class SmartTextParser(Parser):
+    """
+    Parser for both the smartlinks and the smartembeds, recognising them
+    in a single left-to-right scan of the text.
+
+    Each ``[[`` or ``{{`` not preceded by a slash is tried against
+    :py:attr:`SmartLinkParser.finder` or :py:attr:`SmartEmbedParser.finder`
+    respectively (see :py:func:`smartlinks.scanner.scan`), and the matches
+    are rendered by those parsers into a single output. Unlike running the
+    two parsers one after another, the output of the smartlinks is never
+    scanned again.
+    """
+
+    def __init__(self, smartlinks_conf, batch=False):
+        super(SmartTextParser, self).__init__(smartlinks_conf, batch)
+        self.link_parser = SmartLinkParser(smartlinks_conf)
+        self.embed_parser = SmartEmbedParser(smartlinks_conf)
+
+        # Outcomes of the bulk resolution are shared with the sub-parsers.
+        self.link_parser._resolved = self._resolved
+        self.embed_parser._resolved = self._resolved
+
+    def process_smartlinks(self, value):
+        """
+        :param value: Str or Unicode.
+        :rtype: SafeString
+
+        Replace both the smartlinks and the smartembeds with their values
+        inside the text. Texts with neither are returned untouched.
+        """
+        if u"[[" not in value and u"{{" not in value:
+            return mark_safe(value)
+        if self.batch:
+            return mark_safe(u"".join(
+                self.iter_smartlinks(value, window=None)))
+
+        output = []
+        position = 0
+        for parser, match in self.tokenize(value):
+            output.append(value[position:match.start()])
+            output.append(parser.parse(match))
+            position = match.end()
+        output.append(value[position:])
+        return mark_safe(u"".join(output))
+
+    def tokenize(self, value):
+        """
+        :param value: Str or Unicode.
+
+        Iterate over both the smartlinks and the smartembeds in the text, in
+        order, as ``(parser, match)`` tuples.
+        """
+        parsers = {
+            self.link_parser.finder: self.link_parser,
+            self.embed_parser.finder: self.embed_parser,
+        }
+        for finder, match in scan(value, list(parsers)):
+            yield parsers[finder], match
+
 class NoSmartLinkConfFoundException(Exception):
     pass
\ No newline at end of file
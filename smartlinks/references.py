@@ -0,0 +1,290 @@
+"""
+Reverse index of the smartlinks, see :py:class:`smartlinks.models.LinkReference`,
+and the re-rendering of the
+:py:class:`smartlinks.fields.RenderedSmartTextField` fields it drives.
+"""
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils.safestring import mark_safe
+
+from smartlinks import register_link_source
+from smartlinks.conf import smartlinks_conf
+from smartlinks.models import IndexEntry, LinkReference
+from smartlinks.parser import SmartTextParser, NoSmartLinkConfFoundException
+
+#: Maps the models registered with :py:func:`smartlinks.register_link_source`
+#: to the names of their fields containing smartlinks.
+link_sources = {}
+
+#: Maps the models with :py:class:`smartlinks.fields.RenderedSmartTextField`
+#: fields to lists of ``(rendered field name, source field name)``.
+rendered_fields = {}
+
+#: Number of rows re-rendered together by :py:func:`rerender_dependents`.
+rerender_chunk_size = 100
+
+
+def update_references(sender, instance, created='deleteme', **kw):
+    """
+    Update the :py:class:`LinkReference` entries for the smartlinks in the
+    fields of the ``instance``. Only the entries which changed are deleted or
+    inserted.
+
+    This function gets attached to the ``post_save`` and ``post_delete``
+    signals by :py:func:`smartlinks.register_link_source`.
+
+    :param sender: Model registered as a link source.
+    :param instance: Instance being saved or deleted.
+    :param created: Same as in
+        :py:meth:`smartlinks.conf.SmartLinkConf.update_index_for_object`.
+    """
+    fields = link_sources[sender]
+    update_fields = kw.get('update_fields')
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+
+    content_type = ContentType.objects.get_for_model(sender)
+    entries = LinkReference.objects.filter(
+        source_content_type=content_type,
+        source_object_id=instance.pk
+    )
+
+    if created == 'deleteme':
+        entries.delete()
+        return
+
+    new = set(get_references(instance, fields))
+    old = {}
+    if not created:
+        for row in entries.values_list('pk', 'field', 'value',
+                                       'target_content_type',
+                                       'target_object_id'):
+            old[row[1:]] = row[0]
+
+    with transaction.atomic():
+        removed = [pk for reference, pk in old.items() if reference not in new]
+        if removed:
+            LinkReference.objects.filter(pk__in=removed).delete()
+        LinkReference.objects.bulk_create([
+            LinkReference(
+                field=field,
+                value=value,
+                target_content_type_id=target_content_type_id,
+                target_object_id=target_object_id,
+                source_content_type=content_type,
+                source_object_id=instance.pk
+            )
+            for field, value, target_content_type_id, target_object_id in new
+            if (field, value, target_content_type_id, target_object_id)
+            not in old
+        ])
+
+
+def get_references(instance, fields):
+    """
+    Find and resolve the smartlinks and smartembeds in the ``fields`` of the
+    ``instance``, all of them together.
+
+    :return: List of ``(field, stemmed query, target content type id,
+        target object id)``, the target being ``None`` for smartlinks which
+        did not resolve. Smartlinks resolving to objects which are not model
+        instances are left out.
+    """
+    if not smartlinks_conf:
+        return []
+
+    parser = SmartTextParser(smartlinks_conf)
+    tokens = []
+    for field in fields:
+        value = _raw_text(getattr(instance, field))
+        if value:
+            tokens.extend((field, match)
+                          for match_parser, match in parser.tokenize(value))
+
+    references = []
+    parser.resolve_in_bulk([match for field, match in tokens])
+    try:
+        for field, match in tokens:
+            model_name = match.group("ModelName")
+            query = match.group("Query").strip()
+            try:
+                obj = parser._find_object(match)
+            except NoSmartLinkConfFoundException:
+                conf = smartlinks_conf.values()[0]
+                references.append((field, conf._stem(query), None, None))
+                continue
+            except (IndexEntry.DoesNotExist,
+                    IndexEntry.MultipleObjectsReturned):
+                obj = None
+
+            model = parser.conf.resolve_model()
+            target_content_type_id = None
+            if model is not None and (model_name or obj is not None):
+                target_content_type_id = ContentType.objects.get_for_model(
+                    model).pk
+            elif obj is not None:
+                continue
+            references.append((
+                field,
+                parser.conf._stem(query),
+                target_content_type_id,
+                getattr(obj, 'pk', None)
+            ))
+    finally:
+        parser._resolved.clear()
+    return references
+
+
+def references_to(obj):
+    """
+    :return: Queryset of the :py:class:`LinkReference` entries for the
+        smartlinks resolving to ``obj``, ie "what links here".
+    """
+    return LinkReference.objects.filter(
+        target_content_type=ContentType.objects.get_for_model(obj),
+        target_object_id=obj.pk
+    )
+
+
+def broken_references():
+    """
+    :return: Queryset of the :py:class:`LinkReference` entries for the
+        smartlinks which did not resolve, or were ambiguous.
+    """
+    return LinkReference.objects.filter(target_object_id__isnull=True)
+
+
+def references_matching(values):
+    """
+    :param values: Stemmed values, as in the :py:class:`IndexEntry` table.
+
+    :return: Queryset of the :py:class:`LinkReference` entries whose query
+        could resolve differently once index entries with the ``values`` are
+        added or removed, ie whose query is one of the values or a prefix of
+        one.
+    """
+    prefixes = set()
+    for value in values:
+        prefixes.update(value[:length] for length in range(1, len(value) + 1))
+    return LinkReference.objects.filter(value__in=prefixes)
+
+
+def register_rendered_field(model, name, source):
+    """
+    Keep the field ``name`` of the ``model`` rendered from the field
+    ``source``, recording the smartlinks of the ``source`` in the reverse
+    index (see :py:func:`smartlinks.register_link_source`) so that
+    :py:func:`rerender_dependents` knows which rows to re-render.
+
+    Called by :py:class:`smartlinks.fields.RenderedSmartTextField` once the
+    model is prepared.
+    """
+    rendered_fields.setdefault(model, []).append((name, source))
+    fields = list(link_sources.get(model, ()))
+    if source not in fields:
+        fields.append(source)
+    register_link_source(model, fields)
+
+
+def render_text(value):
+    """
+    Render the smartlinks and smartembeds in the raw ``value``, as the
+    ``smartlinks`` template filter does.
+
+    :param value: Str, Unicode, :py:class:`smartlinks.fields.SmartLink` or
+        ``None``.
+    :rtype: SafeString
+    """
+    value = _raw_text(value)
+    if not smartlinks_conf:
+        return mark_safe(value)
+    return SmartTextParser(smartlinks_conf, batch=True).process_smartlinks(
+        value)
+
+
+def rerender_dependents(values, instance=None):
+    """
+    Re-render the :py:class:`smartlinks.fields.RenderedSmartTextField`
+    fields whose output might have changed, a chunk of
+    :py:data:`rerender_chunk_size` rows at a time: the texts of a chunk are
+    resolved together (see
+    :py:meth:`smartlinks.parser.Parser.process_many`) and written with one
+    ``UPDATE`` per row, bypassing the signals. The reverse index of the rows
+    is then brought up to date, as the smartlinks might now resolve to
+    different objects.
+
+    Called by :py:meth:`smartlinks.conf.SmartLinkConf.update_index_for_object`.
+
+    :param values: Values of the index entries added or removed. Texts with
+        a smartlink whose query is one of them or a prefix of one, ie which
+        could resolve differently, are re-rendered.
+    :param instance: Object saved or deleted, texts with a smartlink which
+        resolved to it are re-rendered as well.
+    :return: Number of the rows re-rendered.
+    """
+    if not rendered_fields:
+        return 0
+
+    references = LinkReference.objects.none()
+    if values:
+        references = references_matching(values)
+    if instance is not None:
+        references = references | references_to(instance)
+
+    content_types = dict(
+        (ContentType.objects.get_for_model(model).pk, model)
+        for model in rendered_fields)
+    rows = defaultdict(set)
+    for content_type_id, object_id, field in references.filter(
+            source_content_type__in=list(content_types)
+    ).values_list('source_content_type', 'source_object_id', 'field'):
+        model = content_types[content_type_id]
+        if field in [source for name, source in rendered_fields[model]]:
+            rows[model].add(object_id)
+
+    rerendered = 0
+    for model, object_ids in rows.items():
+        object_ids = sorted(object_ids)
+        for start in range(0, len(object_ids), rerender_chunk_size):
+            rerendered += _rerender(
+                model, object_ids[start:start + rerender_chunk_size])
+    return rerendered
+
+
+def _rerender(model, object_ids):
+    """
+    Re-render the rendered fields of the ``model`` instances with the
+    ``object_ids``.
+
+    :return: Number of the rows re-rendered.
+    """
+    fields = rendered_fields[model]
+    instances = list(model._default_manager.filter(pk__in=object_ids))
+    if not instances:
+        return 0
+
+    texts = [_raw_text(getattr(instance, source))
+             for instance in instances for name, source in fields]
+    if smartlinks_conf:
+        texts = SmartTextParser(smartlinks_conf).process_many(texts)
+    else:
+        texts = [mark_safe(text) for text in texts]
+
+    texts = iter(texts)
+    for instance in instances:
+        rendered = dict((name, next(texts)) for name, source in fields)
+        with transaction.atomic():
+            model._default_manager.filter(pk=instance.pk).update(**rendered)
+        for name, value in rendered.items():
+            setattr(instance, name, value)
+        update_references(model, instance, created=False)
+    return len(instances)
+
+
+def _raw_text(value):
+    """
+    :return: Raw text of a text field or a ``SmartLinkField``.
+    """
+    return getattr(value, 'raw', value) or u''
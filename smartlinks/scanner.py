@@ -0,0 +1,345 @@
+"""
+Linear-time scanner for the smartlink and smartembed syntax.
+
+The grammar used to be defined by regular expressions, whose nested
+quantifiers made malformed input (eg a long run of ``| aaa | aaa`` never
+closed with ``}}``) backtrack for a time growing polynomially with its
+length. The finders below accept exactly the same language, with the same
+groups, but look at each character of the text a bounded number of times.
+
+They have the subset of the compiled regular expression interface used by
+the parsers: :py:meth:`Finder.match`, :py:meth:`Finder.search`,
+:py:meth:`Finder.finditer` and :py:meth:`Finder.sub`, returning
+:py:class:`Match` objects.
+
+As in the regular expressions, which were not using the ``re.UNICODE``
+flag, whitespace and word characters are the ASCII ones.
+"""
+import string
+
+WHITESPACE = frozenset(u" \t\n\r\f\v")
+WORD = frozenset(string.ascii_letters + string.digits + u"_")
+
+
+class Match(object):
+    """
+    Smartlink or smartembed found in a text, behaving like the match objects
+    of the regular expressions for the named groups.
+    """
+
+    def __init__(self, finder, text, start, end, groups):
+        """
+        :param finder: :py:class:`Finder` which found the match.
+        :param text: Text the match was found in.
+        :param start: Start of the match in the ``text``.
+        :param end: End of the match in the ``text``.
+        :param groups: Dictionary mapping the group names to ``(start, end)``
+            spans, or ``None`` for the groups which did not participate.
+        """
+        self.re = finder
+        self.string = text
+        self._start = start
+        self._end = end
+        self._groups = groups
+
+    def group(self, *names):
+        if not names:
+            names = (0,)
+        found = tuple(self._group(name) for name in names)
+        return found[0] if len(found) == 1 else found
+
+    def groupdict(self, default=None):
+        return dict((name, self._group(name, default))
+                    for name in self.re.group_names)
+
+    def start(self, name=0):
+        return self.span(name)[0]
+
+    def end(self, name=0):
+        return self.span(name)[1]
+
+    def span(self, name=0):
+        if name == 0:
+            return self._start, self._end
+        return self._groups[name] or (-1, -1)
+
+    def _group(self, name, default=None):
+        if name == 0:
+            return self.string[self._start:self._end]
+        if name not in self._groups:
+            raise IndexError("no such group")
+        span = self._groups[name]
+        if span is None:
+            return default
+        return self.string[span[0]:span[1]]
+
+    def __repr__(self):
+        return "<smartlinks.scanner.Match object; span=%r, match=%r>" % (
+            self.span(), self.group())
+
+
+class Finder(object):
+    """
+    Base class for the finders, matching at the unescaped occurrences of
+    :py:attr:`opening`.
+    """
+
+    #: Characters starting the syntax, eg ``[[``.
+    opening = None
+
+    #: Names of the groups of the matches.
+    group_names = ()
+
+    def match(self, text, pos=0):
+        """
+        :return: :py:class:`Match` at the position ``pos`` of the ``text``,
+            or ``None``.
+        """
+        return self._match(text, pos, _ScanState(text))
+
+    def search(self, text, pos=0):
+        """
+        :return: First :py:class:`Match` in the ``text`` from the position
+            ``pos``, or ``None``.
+        """
+        for match in self.finditer(text, pos):
+            return match
+
+    def finditer(self, text, pos=0):
+        """
+        Iterate over the non-overlapping matches in the ``text``, from the
+        position ``pos``.
+        """
+        for finder, match in scan(text, (self,), pos):
+            yield match
+
+    def sub(self, repl, text):
+        """
+        Replace the matches in the ``text`` with ``repl(match)``.
+
+        :param repl: Callable taking a :py:class:`Match`.
+        """
+        output = []
+        position = 0
+        for match in self.finditer(text):
+            output.append(text[position:match.start()])
+            output.append(repl(match))
+            position = match.end()
+        output.append(text[position:])
+        return text[:0].join(output)
+
+    def _match(self, text, pos, state):
+        if not text.startswith(self.opening, pos):
+            return None
+        if pos > 0 and text[pos - 1] == u"\\":
+            return None
+        return self._match_at(text, pos, state)
+
+    def _match_at(self, text, pos, state):
+        raise NotImplementedError()
+
+    def _match_query(self, text, pos, state):
+        """
+        Match ``\\s*((?P<ModelName>\\w+)\\s*\\->)?(?P<Query>[^\\]\\|]+)`` from
+        ``pos``, right after the opening.
+
+        :return: ``(model span, query span)``, or ``None``.
+        """
+        start = _skip(text, pos, WHITESPACE)
+
+        # The query ends at the first ']' or '|', wherever it starts.
+        end = min(state.find(u"]", start), state.find(u"|", start))
+        if end == start:
+            if start == pos:
+                return None
+            # The query can not be empty, it takes the last whitespace.
+            return None, (start - 1, end)
+
+        model_end = _skip(text, start, WORD)
+        if model_end > start:
+            arrow = _skip(text, model_end, WHITESPACE)
+            if text.startswith(u"->", arrow) and arrow + 2 < end:
+                return (start, model_end), (arrow + 2, end)
+        return None, (start, end)
+
+
+class LinkFinder(Finder):
+    """
+    Finder for the smartlinks, accepting the same language as::
+
+        (?<![\\\\])\\[\\[\\s*((?P<ModelName>\\w+)\\s*\\->)?(?P<Query>[^\\]\\|]+)
+        (\\|(?P<VerboseText>[^\\]]+))?\\s*\\]\\]
+    """
+
+    opening = u"[["
+    group_names = ('ModelName', 'Query', 'VerboseText')
+
+    def _match_at(self, text, pos, state):
+        found = self._match_query(text, pos + 2, state)
+        if found is None:
+            return None
+        model, query = found
+        groups = {'ModelName': model, 'Query': query, 'VerboseText': None}
+
+        # The query is greedy and takes any whitespace before the ']]'.
+        query_end = query[1]
+        if text.startswith(u"]]", query_end):
+            end = query_end + 2
+        elif text.startswith(u"|", query_end):
+            verbose_end = state.find(u"]", query_end + 1, 'verbose')
+            if (verbose_end == query_end + 1
+                    or not text.startswith(u"]]", verbose_end)):
+                return None
+            groups['VerboseText'] = (query_end + 1, verbose_end)
+            end = verbose_end + 2
+        else:
+            return None
+        return Match(self, text, pos, end, groups)
+
+
+class EmbedFinder(Finder):
+    """
+    Finder for the smartembeds, accepting the same language as::
+
+        (?<![\\\\])\\{\\{\\s*((?P<ModelName>\\w+)\\s*\\->)?(?P<Query>[^\\]\\|]+)
+        \\|\\s*(?P<AttrName>\\w+)
+        (?P<Options>(\\s*\\|\\s*((\\w+\\s*=\\s*\\w+)|(\\w+)))+)?\\s*\\}\\}
+    """
+
+    opening = u"{{"
+    group_names = ('ModelName', 'Query', 'AttrName', 'Options')
+
+    def _match_at(self, text, pos, state):
+        found = self._match_query(text, pos + 2, state)
+        if found is None:
+            return None
+        model, query = found
+        if not text.startswith(u"|", query[1]):
+            return None
+
+        # Whatever precedes it, the rest only depends on where the query
+        # ends, so it is parsed once for all the openings before.
+        if query[1] not in state.tails:
+            state.tails[query[1]] = self._match_tail(text, query[1] + 1)
+        tail = state.tails[query[1]]
+        if tail is None:
+            return None
+        attr, options, end = tail
+        return Match(self, text, pos, end, {
+            'ModelName': model,
+            'Query': query,
+            'AttrName': attr,
+            'Options': options,
+        })
+
+    def _match_tail(self, text, pos):
+        """
+        Match the attribute name, the options and the closing ``}}``.
+
+        :return: ``(attribute span, options span, end)``, or ``None``.
+        """
+        attr_start = _skip(text, pos, WHITESPACE)
+        attr_end = _skip(text, attr_start, WORD)
+        if attr_end == attr_start:
+            return None
+
+        options_end = attr_end
+        while True:
+            option_end = self._match_option(text, options_end)
+            if option_end is None:
+                break
+            options_end = option_end
+
+        end = _skip(text, options_end, WHITESPACE)
+        if not text.startswith(u"}}", end):
+            return None
+        options = (attr_end, options_end) if options_end > attr_end else None
+        return (attr_start, attr_end), options, end + 2
+
+    def _match_option(self, text, pos):
+        """
+        Match ``\\s*\\|\\s*((\\w+\\s*=\\s*\\w+)|(\\w+))`` from ``pos``.
+
+        :return: End of the option, or ``None``.
+        """
+        pipe = _skip(text, pos, WHITESPACE)
+        if not text.startswith(u"|", pipe):
+            return None
+        name_start = _skip(text, pipe + 1, WHITESPACE)
+        name_end = _skip(text, name_start, WORD)
+        if name_end == name_start:
+            return None
+
+        equals = _skip(text, name_end, WHITESPACE)
+        if text.startswith(u"=", equals):
+            value_start = _skip(text, equals + 1, WHITESPACE)
+            value_end = _skip(text, value_start, WORD)
+            if value_end > value_start:
+                return value_end
+        return name_end
+
+
+def scan(text, finders, pos=0):
+    """
+    Iterate over the matches of any of the ``finders`` in the ``text``,
+    left to right, as ``(finder, match)`` tuples. The finders must have
+    different openings.
+    """
+    state = _ScanState(text)
+    while True:
+        candidates = [(state.find(finder.opening, pos), finder)
+                      for finder in finders]
+        start, finder = min(candidates, key=lambda candidate: candidate[0])
+        if start == len(text):
+            return
+
+        match = finder._match(text, start, state)
+        if match is None:
+            pos = start + 1
+        else:
+            yield finder, match
+            pos = match.end()
+
+
+class _ScanState(object):
+    """
+    State of a scan of a text, remembering what was found so that moving
+    forward through the text does not look at the same characters again.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+        # Maps ``(substring, stream)`` to ``(searched from, found at)``.
+        self._found = {}
+
+        # Outcomes of :py:meth:`EmbedFinder._match_tail` by position.
+        self.tails = {}
+
+    def find(self, sub, pos, stream=None):
+        """
+        :param stream: Name of the sequence of searches, whose positions
+            have to be increasing for the text to be searched only once.
+
+        :return: Position of the first ``sub`` at or after ``pos``, or the
+            length of the text if there is none.
+        """
+        found = self._found.get((sub, stream))
+        if found is not None and found[0] <= pos <= found[1]:
+            return found[1]
+        position = self.text.find(sub, pos)
+        if position == -1:
+            position = len(self.text)
+        self._found[(sub, stream)] = (pos, position)
+        return position
+
+
+def _skip(text, pos, chars):
+    """
+    :return: Position of the first character not in ``chars`` at or after
+        ``pos``.
+    """
+    end = len(text)
+    while pos < end and text[pos] in chars:
+        pos += 1
+    return pos
@@ -2,25 +2,33 @@ from __future__ import absolute_import
 
 from django import template
 
+from smartlinks.cache import cached_render
 from smartlinks.conf import smartlinks_conf
-from ..parser import SmartLinkParser, SmartEmbedParser
+from ..parser import SmartLinkParser, SmartTextParser
 from ..models import IndexEntry
 
 register = template.Library()
 
 @register.filter
-def smartlinks(value):
+def smartlinks(value, arg=None):
     """
     Parse the smartlinks in the data piped through the filter.
 
     Replaces each smartlink with a corresponding
-    ``<a href=...>...</a>`` link
+    ``<a href=...>...</a>`` link and each smartembed with the embedded
+    attribute, in a single scan. All of them are resolved in bulk.
+
+    The output is cached if ``SMARTLINKS_RENDER_CACHE`` setting is set,
+    see :py:func:`smartlinks.cache.cached_render`. The cache can be bypassed
+    with ``{{ page.content|smartlinks:"nocache" }}``.
     """
-    link_parser = SmartLinkParser(smartlinks_conf)
-    embed_parser = SmartEmbedParser(smartlinks_conf)
-    for parser in (link_parser, embed_parser):
-        value = parser.process_smartlinks(value)
-    return value
+    if arg == 'nocache':
+        return _render_smartlinks(value)
+    return cached_render(value, _render_smartlinks)
+
+def _render_smartlinks(value):
+    parser = SmartTextParser(smartlinks_conf, batch=True)
+    return parser.process_smartlinks(value)
 
 @register.filter
 def smartlink_obj(value):
@@ -1,7 +1,8 @@
 from django.test import TestCase
 from django.db import models
 
-from smartlinks.conf import SmartLinkConf
+from smartlinks.conf import SmartLinkConf, \
+    smartlinks_conf as global_smartlinks_conf
 from smartlinks import register, register_smart_link,\
     IncorrectlyConfiguredSmartlinkException, AlreadyRegisteredSmartlinkException
 
@@ -11,6 +12,12 @@ from .models import *
 from .parser import *
 from .management import *
 from .fields import *
+from .cache import *
+from .memory_index import *
+from .scanner import *
+from .references import *
+from .forms import *
+from .budgets import *
 
 import smartlinks.conf as conf
 
@@ -72,6 +79,9 @@ class RegistrationTest(TestCase):
             'event': conf
         })
 
+        # It is the global dictionary which is updated and returned.
+        self.assertTrue(smartlinks_conf is global_smartlinks_conf)
+
         # TODO -- check sending/receiving signals
 
     def testSanityChecks(self):
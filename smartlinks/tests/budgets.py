@@ -0,0 +1,272 @@
+"""
+Maximum numbers of queries made by the public entry points. They must not
+depend on the number of smartlinks per document or of objects in the index,
+so that a lookup made for each smartlink or entry fails loudly.
+"""
+from django import forms
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import signals
+from django.forms.formsets import formset_factory
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from smartlinks import register_smart_link
+from smartlinks.conf import SmartLinkConf, smartlinks_conf
+from smartlinks.fields import SmartLinkFormField, SmartLinkValidator,\
+    prefetch_smartlinks
+from smartlinks.forms import SmartLinkFormSet
+from smartlinks.models import IndexEntry
+from smartlinks.templatetags.smartlinks import smartlinks, smartlink_obj,\
+    smartlink_url
+
+from .models import Movie2, LinkModel, Page
+
+#: Maximum numbers of queries by entry point, whatever the number of
+#: smartlinks per document or of objects in the index. Resolution takes an
+#: exact and a prefix lookup in the index and a query fetching the objects,
+#: once for the typed smartlinks of each configuration and once for all the
+#: untyped ones.
+BUDGETS = {
+    'smartlinks': 6,
+    'smartlink_obj': 3,
+    'smartlink_url': 3,
+    'SmartLink': 3,
+    'prefetch_smartlinks': 1 + 6,
+    'SmartLinkValidator': 3,
+    'SmartLinkFormSet': 6,
+
+    # The write itself, checking the object is still in the queryset, the
+    # entries written (within a savepoint) and the rendered fields depending
+    # on them. Saves not changing the title skip the index.
+    'save created': 1 + 5,
+    'save edited': 1 + 7,
+    'save unchanged': 1,
+    'delete': 1 + 3,
+}
+
+
+class LinkForm(forms.Form):
+    link = SmartLinkFormField(verify_exists=True)
+
+
+class QueryBudgetTest(TestCase):
+    #: Numbers of smartlinks per document the budgets are checked for, enough
+    #: for all the kinds of smartlinks in each document, see
+    #: :py:meth:`smartlinks`.
+    link_counts = (10, 50)
+
+    #: Number of objects added to the index between two measurements.
+    index_growth = 25
+
+    def setUp(self):
+        # Only the configuration of the test is registered, the ones left by
+        # other tests would change the numbers of queries.
+        self.registered = isolate_registry()
+
+        self.conf = SmartLinkConf(Movie2.objects, searched_fields=('title',))
+        register_smart_link(('budget',), self.conf)
+
+        self.movies = []
+        self.add_movies(max(self.link_counts))
+
+        # Content types are cached for the process, not counted.
+        for model in (Movie2, LinkModel, Page):
+            ContentType.objects.get_for_model(model)
+
+    def tearDown(self):
+        restore_registry(self.registered)
+        IndexEntry.objects.all().delete()
+
+    def add_movies(self, count):
+        for i in range(len(self.movies), len(self.movies) + count):
+            self.movies.append(Movie2.objects.create(
+                title="Movie %s" % i, slug="movie-%s" % i, year=2001))
+
+    def index_sizes(self):
+        """
+        Yield the number of index entries twice, with :py:attr:`index_growth`
+        more movies indexed the second time.
+        """
+        yield IndexEntry.objects.count()
+        self.add_movies(self.index_growth)
+        yield IndexEntry.objects.count()
+
+    def smartlinks(self, count):
+        """
+        :return: ``count`` smartlinks, typed and untyped, resolving and not.
+        """
+        links = []
+        for i in range(count):
+            query = self.movies[i].title if i % 3 else "Missing %s" % i
+            if i % 2:
+                links.append(u"[[ budget->%s ]]" % query)
+            else:
+                links.append(u"[[ %s ]]" % query)
+        return links
+
+    def measure(self, function, *args):
+        """
+        :return: SQL of the queries made by ``function(*args)``.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            function(*args)
+        return [query['sql'] for query in queries]
+
+    def assertWithinBudget(self, name, measurements):
+        """
+        :param measurements: Dictionary mapping the sizes, of the documents
+            or of the index, to the queries made by :py:meth:`measure`.
+        """
+        counts = dict((size, len(queries))
+                      for size, queries in measurements.items())
+        report = "\n".join(
+            "%s queries at size %s:\n%s" % (len(queries), size,
+                                            "\n".join(queries))
+            for size, queries in sorted(measurements.items()))
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            "%s made different numbers of queries by size:\n%s" % (
+                name, report))
+        self.assertLessEqual(
+            max(counts.values()), BUDGETS[name],
+            "%s is over its budget of %s queries:\n%s" % (
+                name, BUDGETS[name], report))
+
+    def testSmartlinksFilter(self):
+        self.assertWithinBudget('smartlinks', dict(
+            (count, self.measure(smartlinks,
+                                 u" and ".join(self.smartlinks(count)),
+                                 'nocache'))
+            for count in self.link_counts))
+
+    def testSmartlinkObjAndUrl(self):
+        for link in self.smartlinks(3):
+            for name, function in (('smartlink_obj', smartlink_obj),
+                                   ('smartlink_url', smartlink_url)):
+                self.assertWithinBudget(name, dict(
+                    (size, self.measure(function, link))
+                    for size in self.index_sizes()))
+
+    def testSmartLink(self):
+        def access(instance):
+            instance.link.object
+            instance.link.url
+            instance.link.rendered_link
+            instance.link.url
+
+        for link in self.smartlinks(3):
+            self.assertWithinBudget('SmartLink', dict(
+                (size, self.measure(access, LinkModel(link=link)))
+                for size in self.index_sizes()))
+
+    def testPrefetchSmartlinks(self):
+        measurements = {}
+        for count in self.link_counts:
+            LinkModel.objects.all().delete()
+            for link in self.smartlinks(count):
+                LinkModel.objects.create(link=link)
+            measurements[count] = self.measure(
+                prefetch_smartlinks, LinkModel.objects.all(), 'link')
+        self.assertWithinBudget('prefetch_smartlinks', measurements)
+
+    def testSmartLinkValidator(self):
+        validator = SmartLinkValidator(verify_exists=True)
+
+        def validate(link):
+            try:
+                validator(link)
+            except forms.ValidationError:
+                pass
+
+        for link in self.smartlinks(3):
+            self.assertWithinBudget('SmartLinkValidator', dict(
+                (size, self.measure(validate, link))
+                for size in self.index_sizes()))
+
+    def testSmartLinkFormSet(self):
+        formset_class = formset_factory(LinkForm, formset=SmartLinkFormSet)
+        measurements = {}
+        for count in self.link_counts:
+            data = {
+                'form-TOTAL_FORMS': str(count),
+                'form-INITIAL_FORMS': '0',
+                'form-MIN_NUM_FORMS': '0',
+                'form-MAX_NUM_FORMS': '1000',
+            }
+            for i, link in enumerate(self.smartlinks(count)):
+                data['form-%s-link' % i] = link
+            measurements[count] = self.measure(formset_class(data).is_valid)
+        self.assertWithinBudget('SmartLinkFormSet', measurements)
+
+    def testSaveAndDelete(self):
+        measurements = dict((name, {}) for name in (
+            'save created', 'save edited', 'save unchanged', 'delete'))
+        for count in self.link_counts:
+            Page.objects.all().delete()
+            Page.objects.create(title="Movies",
+                                body=u" ".join(self.smartlinks(count)))
+
+            movie = Movie2(title="New %s" % count, slug="new", year=2001)
+            measurements['save created'][count] = self.measure(movie.save)
+
+            movie.title = "Renamed %s" % count
+            measurements['save edited'][count] = self.measure(movie.save)
+
+            movie.year = 2002
+            measurements['save unchanged'][count] = self.measure(movie.save)
+
+            measurements['delete'][count] = self.measure(movie.delete)
+
+        for name, by_count in measurements.items():
+            self.assertWithinBudget(name, by_count)
+
+
+def connect(conf):
+    """
+    Connect the signal handlers of a registered configuration, as
+    :py:func:`smartlinks.register_smart_link` does.
+    """
+    model = conf.resolve_model()
+    if model is None:
+        return
+    for signal in (signals.post_save, signals.post_delete):
+        signal.connect(conf.update_index_for_object, sender=model)
+    if conf._dependencies is not None:
+        signals.post_init.connect(conf.snapshot_instance, sender=model)
+
+
+def disconnect(conf):
+    model = conf.resolve_model()
+    if model is None:
+        return
+    for signal in (signals.post_save, signals.post_delete):
+        signal.disconnect(conf.update_index_for_object, sender=model)
+    signals.post_init.disconnect(conf.snapshot_instance, sender=model)
+
+
+def isolate_registry():
+    """
+    Unregister all the configurations and disconnect their signal handlers,
+    for tests which register their own.
+
+    :return: Registered configurations, for :py:func:`restore_registry`.
+    """
+    registered = list(smartlinks_conf.items())
+    for conf in set(smartlinks_conf.values()):
+        disconnect(conf)
+    smartlinks_conf.clear()
+    return registered
+
+
+def restore_registry(registered):
+    """
+    Unregister the configurations registered since
+    :py:func:`isolate_registry` and register the previous ones again.
+    """
+    for conf in set(smartlinks_conf.values()):
+        disconnect(conf)
+    smartlinks_conf.clear()
+    smartlinks_conf.update(registered)
+    for conf in set(smartlinks_conf.values()):
+        connect(conf)
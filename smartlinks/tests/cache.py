@@ -0,0 +1,262 @@
+import hashlib
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.safestring import SafeData
+
+from smartlinks.cache import LRUResolutionCache, DjangoResolutionCache,\
+    cached_render, bump_index_generation, INDEX_GENERATION_KEY
+from smartlinks.conf import SmartLinkConf, UNRESOLVED, AMBIGUOUS
+from smartlinks.models import IndexEntry
+
+from smartlinks.templatetags.smartlinks import smartlinks
+
+from smartlinks.tests.models import Movie
+
+
+class LRUResolutionCacheTest(TestCase):
+    def testGetSet(self):
+        cache = LRUResolutionCache()
+        cache.set_many(1, {'madmax': 10, 'dirtyharry': AMBIGUOUS})
+        cache.set_many(2, {'madmax': UNRESOLVED})
+
+        self.assertEqual(
+            cache.get_many(1, ['madmax', 'dirtyharry', 'amelie']),
+            {'madmax': 10, 'dirtyharry': AMBIGUOUS}
+        )
+        self.assertEqual(cache.get_many(2, ['madmax']),
+                         {'madmax': UNRESOLVED})
+
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 1)
+
+    def testEviction(self):
+        cache = LRUResolutionCache(max_size=2)
+        cache.set_many(1, {'a': 1})
+        cache.set_many(1, {'b': 2})
+
+        # Using 'a' makes 'b' the least recently used one.
+        cache.get_many(1, ['a'])
+        cache.set_many(1, {'c': 3})
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get_many(1, ['a', 'b', 'c']),
+                         {'a': 1, 'c': 3})
+
+    def testExpiry(self):
+        cache = LRUResolutionCache(ttl=0)
+        cache.set_many(1, {'a': 1})
+        self.assertEqual(cache.get_many(1, ['a']), {})
+
+        cache = LRUResolutionCache(ttl=None)
+        cache.set_many(1, {'a': 1})
+        self.assertEqual(cache.get_many(1, ['a']), {'a': 1})
+
+    def testInvalidate(self):
+        cache = LRUResolutionCache()
+        cache.set_many(1, {'a': 1})
+        cache.set_many(2, {'a': 2})
+        cache.invalidate(1)
+        self.assertEqual(cache.get_many(1, ['a']), {})
+        self.assertEqual(cache.get_many(2, ['a']), {'a': 2})
+
+    def testInvalidatedDuringLookup(self):
+        cache = LRUResolutionCache()
+        generation = cache.generation(1)
+        self.assertEqual(cache.get_many(1, ['a'], generation), {})
+
+        # Outcome looked up before the invalidation is not stored.
+        cache.invalidate(1)
+        cache.set_many(1, {'a': 1}, generation)
+        self.assertEqual(cache.get_many(1, ['a']), {})
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'smartlinks-tests',
+    }
+})
+class DjangoResolutionCacheTest(TestCase):
+    def setUp(self):
+        self.cache = DjangoResolutionCache()
+        self.cache.cache.clear()
+
+    def testGetSet(self):
+        self.cache.set_many(1, {u'madmax': 10, u'dirtyharry': AMBIGUOUS})
+        self.cache.set_many(2, {u'madmax': UNRESOLVED})
+
+        self.assertEqual(
+            self.cache.get_many(1, [u'madmax', u'dirtyharry', u'amelie']),
+            {u'madmax': 10, u'dirtyharry': AMBIGUOUS}
+        )
+        self.assertEqual(self.cache.get_many(2, [u'madmax']),
+                         {u'madmax': UNRESOLVED})
+
+        self.assertEqual(self.cache.hits, 3)
+        self.assertEqual(self.cache.misses, 1)
+
+    def testInvalidateIsShared(self):
+        # Two instances over the same backend behave like two processes.
+        other = DjangoResolutionCache()
+        self.cache.set_many(1, {u'a': 1})
+        self.cache.set_many(2, {u'a': 2})
+        self.assertEqual(other.get_many(1, [u'a']), {u'a': 1})
+
+        other.invalidate(1)
+        self.assertEqual(self.cache.get_many(1, [u'a']), {})
+        self.assertEqual(self.cache.get_many(2, [u'a']), {u'a': 2})
+
+    def testInvalidatedDuringLookup(self):
+        generation = self.cache.generation(1)
+        self.assertEqual(self.cache.get_many(1, [u'a'], generation), {})
+
+        # Outcome looked up before the invalidation is not stored.
+        DjangoResolutionCache().invalidate(1)
+        self.cache.set_many(1, {u'a': 1}, generation)
+        self.assertEqual(self.cache.get_many(1, [u'a']), {})
+
+    def testLostGeneration(self):
+        self.cache.set_many(1, {u'a': 1})
+        generation = self.cache.generation(1)
+        self.cache.cache.delete(self.cache._generation_key(1))
+        self.assertNotEqual(self.cache.generation(1), generation)
+        self.assertEqual(self.cache.get_many(1, [u'a']), {})
+
+        # Restarts do not reuse a value, even in the same millisecond.
+        generations = set([generation])
+        for i in range(100):
+            self.cache.cache.delete(self.cache._generation_key(1))
+            generations.add(self.cache.generation(1))
+        self.assertEqual(len(generations), 101)
+
+
+class CachedResolutionTest(TestCase):
+    def setUp(self):
+        self.cache = self.make_cache()
+        self.conf = SmartLinkConf(Movie.objects, searched_fields=('title',),
+                                  resolution_cache=self.cache)
+        self.m = Movie.objects.create(title="Mad Max", slug="mad-max",
+                                      year=1984)
+        self.conf.update_index_for_object(Movie, self.m, created=True)
+
+    def tearDown(self):
+        IndexEntry.objects.all().delete()
+
+    def make_cache(self):
+        return LRUResolutionCache()
+
+    def testCachedOutcomes(self):
+        self.assertEqual(self.conf.find_object("Mad Max"), self.m)
+        self.assertRaises(IndexEntry.DoesNotExist,
+                          self.conf.find_object, "Amelie")
+
+        # Only the object itself is fetched, both hits and misses are cached.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.conf.find_object("Mad Max"), self.m)
+        with self.assertNumQueries(0):
+            self.assertRaises(IndexEntry.DoesNotExist,
+                              self.conf.find_object, "Amelie")
+
+        self.assertEqual(self.cache.hits, 2)
+        self.assertEqual(self.cache.misses, 2)
+
+    def testInvalidatedOnIndexUpdate(self):
+        self.assertRaises(IndexEntry.DoesNotExist,
+                          self.conf.find_object, "Amelie")
+
+        amelie = Movie.objects.create(title="Amelie", slug="amelie",
+                                      year=2001)
+        self.conf.update_index_for_object(Movie, amelie, created=True)
+        self.assertEqual(self.conf.find_object("Amelie"), amelie)
+
+        self.conf.update_index_for_object(Movie, amelie, created='deleteme')
+        self.assertRaises(IndexEntry.DoesNotExist,
+                          self.conf.find_object, "Amelie")
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'smartlinks-tests',
+    }
+})
+class SharedCachedResolutionTest(CachedResolutionTest):
+    """
+    Same resolution tests, against the cache shared between processes.
+    """
+    def make_cache(self):
+        cache = DjangoResolutionCache()
+        cache.cache.clear()
+        return cache
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'smartlinks-tests',
+        }
+    },
+    SMARTLINKS_RENDER_CACHE='default',
+    SMARTLINKS_RENDER_CACHE_MAX_LENGTH=100,
+)
+class RenderCacheTest(TestCase):
+    def setUp(self):
+        self.rendered = []
+        caches['default'].clear()
+
+    def render(self, value):
+        self.rendered.append(value)
+        return value.upper()
+
+    def testCachedRender(self):
+        self.assertEqual(cached_render(u"some text", self.render), u"SOME TEXT")
+        self.assertEqual(cached_render(u"some text", self.render), u"SOME TEXT")
+        self.assertEqual(self.rendered, [u"some text"])
+
+        # Any change to the index invalidates the rendered output.
+        bump_index_generation()
+        cached_render(u"some text", self.render)
+        self.assertEqual(self.rendered, [u"some text"] * 2)
+
+        # Also when the generation is lost.
+        caches['default'].delete(INDEX_GENERATION_KEY)
+        cached_render(u"some text", self.render)
+        self.assertEqual(self.rendered, [u"some text"] * 3)
+
+    def testMaxLength(self):
+        cached_render(u"a" * 101, self.render)
+        cached_render(u"a" * 101, self.render)
+        self.assertEqual(len(self.rendered), 2)
+
+    def testIndexUpdateInvalidates(self):
+        cached_render(u"some text", self.render)
+
+        conf = SmartLinkConf(Movie.objects, searched_fields=('title',))
+        conf.update_index_for_object(Movie, Movie.objects.create(
+            title="Mad Max", slug="mad-max", year=1984), created=True)
+
+        cached_render(u"some text", self.render)
+        self.assertEqual(len(self.rendered), 2)
+
+    def testFilter(self):
+        text = u"no smartlinks here"
+        self.assertEqual(smartlinks(text), text)
+
+        # Tamper with the cached output to see where it is coming from.
+        key = 'smartlinks:rendered:%s' % hashlib.sha1(text).hexdigest()
+        generation, output = caches['default'].get(key)
+        self.assertEqual(output, text)
+        caches['default'].set(key, (generation, u"<b>cached</b>"))
+
+        self.assertEqual(smartlinks(text), u"<b>cached</b>")
+        self.assertIsInstance(smartlinks(text), SafeData)
+        self.assertEqual(smartlinks(text, "nocache"), text)
+
+    @override_settings(SMARTLINKS_RENDER_CACHE=None)
+    def testDisabled(self):
+        cached_render(u"some text", self.render)
+        cached_render(u"some text", self.render)
+        self.assertEqual(len(self.rendered), 2)
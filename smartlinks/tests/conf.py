@@ -1,11 +1,18 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.contenttypes.models import ContentType
+from django.template import Template
 from django.template.context import Context
+from django.utils.safestring import SafeData, mark_safe
 
-from smartlinks.conf import SmartLinkConf
+from smartlinks.conf import (SmartLinkConf, lookup_in_index, UNRESOLVED,
+                             AMBIGUOUS)
 from smartlinks.models import IndexEntry
 
-from smartlinks.tests.models import Movie, Teacher, Person
+from django.db.models import signals
+
+from smartlinks.tests.models import Movie, Movie2, Teacher, Person
 
 
 class ConfTest(TestCase):
@@ -130,6 +137,56 @@ class ConfTest(TestCase):
         )
 
         
+    def testRender(self):
+        m = Movie(title=u"Tom & Jerry <3", slug="tom-jerry", year=1940)
+        contexts = {
+            'template': {'obj': m, 'verbose_text': u"<b>Tom</b>"},
+            'unresolved_template': {'verbose_text': u"a & b"},
+            'model_unresolved_template': {'verbose_text': u"a & b",
+                                          'smartlink_text': u"[[ x ]]"},
+            'ambiguous_template': {'verbose_text': u'"quoted"'},
+            'disallowed_embed_template': {'smartlink_text': u"{{ <x> }}"},
+        }
+
+        # Default templates render the same without Django templates.
+        for name, context in contexts.items():
+            with self.assertNumQueries(0):
+                output = self.movie_conf.render(name, context)
+            self.assertEqual(output, getattr(self.movie_conf, name).render(
+                Context(context)))
+            self.assertIsInstance(output, SafeData)
+        self.assertEqual(
+            self.movie_conf.render('template', contexts['template']),
+            u'<a href="/movies/tom-jerry/" '
+            u'title="Tom &amp; Jerry &lt;3 released in 1940">'
+            u'&lt;b&gt;Tom&lt;/b&gt;</a>'
+        )
+
+        # Safe strings are not escaped again.
+        self.assertEqual(
+            self.movie_conf.render('unresolved_template',
+                                   {'verbose_text': mark_safe(u"<i>x</i>")}),
+            u'<span class="smartlinks-unresolved"><i>x</i></span>'
+        )
+
+        # Values Django would not render as is are left to Django.
+        self.assertEqual(
+            self.movie_conf.render('template', {'obj': u"not a model",
+                                                'verbose_text': u"x"}),
+            u'<a href="" title="not a model">x</a>'
+        )
+
+        # Custom templates are rendered by Django.
+        conf = SmartLinkConf(Movie.objects, unresolved_template=Template(
+            u"{{ verbose_text|upper }}"))
+        self.assertEqual(conf.render('unresolved_template',
+                                     {'verbose_text': u"x"}), u"X")
+
+        class MyConf(SmartLinkConf):
+            ambiguous_template = Template(u"ambiguous: {{ verbose_text }}")
+        self.assertEqual(MyConf(Movie.objects).render(
+            'ambiguous_template', {'verbose_text': u"x"}), u"ambiguous: x")
+
     def testFindObject(self):
         self.assertEqual(
             self.movie_conf.find_object(
@@ -192,6 +249,121 @@ class ConfTest(TestCase):
             self.harry2
         )
 
+    def testFindObjects(self):
+        queries = (
+            "Mad Max",
+            "mad-max-1984",
+            unicode(self.m.pk),
+            "Dirty Harry",
+            "Dirty Harry: 1976",
+            "Secret Movie",
+            "Once upon a time in the West",
+        )
+
+        # Exact lookup, prefix lookup for the rest and fetching the objects.
+        with self.assertNumQueries(3):
+            outcomes = self.movie_conf.find_objects(queries)
+
+        self.assertEqual(set(outcomes.keys()), set(queries))
+        self.assertEqual(outcomes["Mad Max"], self.m)
+        self.assertEqual(outcomes["mad-max-1984"], self.m)
+        self.assertEqual(outcomes[unicode(self.m.pk)], self.m)
+        self.assertEqual(outcomes["Dirty Harry: 1976"], self.harry2)
+        self.assertIsInstance(outcomes["Dirty Harry"],
+                              IndexEntry.MultipleObjectsReturned)
+        self.assertIsInstance(outcomes["Secret Movie"],
+                              IndexEntry.DoesNotExist)
+        self.assertIsInstance(outcomes["Once upon a time in the West"],
+                              IndexEntry.DoesNotExist)
+
+        # Falls back to __startswith, ambiguity included.
+        outcomes = self.movie_conf.find_objects(["mad max r", "dirty"])
+        self.assertEqual(outcomes["mad max r"], self.m)
+        self.assertIsInstance(outcomes["dirty"],
+                              IndexEntry.MultipleObjectsReturned)
+
+    def testFindObjectsShortStems(self):
+        # Punctuation stems to nothing, which matches no entry.
+        with self.assertNumQueries(0):
+            outcomes = self.movie_conf.find_objects(["-", "!!"])
+        self.assertIsInstance(outcomes["-"], IndexEntry.DoesNotExist)
+        self.assertIsInstance(outcomes["!!"], IndexEntry.DoesNotExist)
+
+        # Overlapping and one letter stems, still a single prefix query.
+        queries = ["mad max r", "mad max released", "m", "d", "-"]
+        with self.assertNumQueries(3):
+            outcomes = self.movie_conf.find_objects(queries)
+        self.assertEqual(outcomes["mad max r"], self.m)
+        self.assertEqual(outcomes["mad max released"], self.m)
+        self.assertIsInstance(outcomes["m"],
+                              IndexEntry.MultipleObjectsReturned)
+        self.assertIsInstance(outcomes["d"],
+                              IndexEntry.MultipleObjectsReturned)
+        self.assertIsInstance(outcomes["-"], IndexEntry.DoesNotExist)
+
+    def testLookupInIndexAcrossContentTypes(self):
+        mad_max2 = Movie2.objects.create(title="Mad Max", slug="mad-max",
+                                         year=1979)
+        SmartLinkConf(Movie2.objects, searched_fields=('title',)
+                      ).update_index_for_object(Movie2, mad_max2, created=True)
+        movie = ContentType.objects.get_for_model(Movie).pk
+        movie2 = ContentType.objects.get_for_model(Movie2).pk
+
+        # Each stem is looked up in its own content type only, exact and
+        # prefix lookups alike.
+        with self.assertNumQueries(2):
+            found = lookup_in_index({
+                movie: set(["madmax1984", "dirtyharry", "madmaxr"]),
+                movie2: set(["madmax", "dirty", "madmaxr"]),
+            })
+        self.assertEqual(found, {
+            movie: {"madmax1984": self.m.pk, "dirtyharry": AMBIGUOUS,
+                    "madmaxr": self.m.pk},
+            movie2: {"madmax": mad_max2.pk, "dirty": UNRESOLVED,
+                     "madmaxr": UNRESOLVED},
+        })
+
+    def testFindObjectOverriddenCallingSuper(self):
+        class AliasConf(SmartLinkConf):
+            def find_object(self, query):
+                if query == "Max":
+                    query = "Mad Max"
+                return super(AliasConf, self).find_object(query)
+
+        conf = AliasConf(Movie.objects,
+                         searched_fields=self.movie_conf.searched_fields)
+        self.assertEqual(conf.find_object("Max"), self.m)
+        self.assertRaises(IndexEntry.DoesNotExist,
+                          conf.find_object, "Secret Movie")
+
+        outcomes = conf.find_objects(["Max", "Dirty Harry"])
+        self.assertEqual(outcomes["Max"], self.m)
+        self.assertIsInstance(outcomes["Dirty Harry"],
+                              IndexEntry.MultipleObjectsReturned)
+
+    def testFindObjectQueries(self):
+        # Index lookup and fetching the object, no other query.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.movie_conf.find_object("Mad Max"), self.m)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertRaises(IndexEntry.MultipleObjectsReturned,
+                              self.movie_conf.find_object, "dirty")
+        self.assertEqual(len(queries), 2)
+        self.assertIn("LIMIT 2", queries[1]['sql'])
+
+        # The object is loaded through the queryset of the configuration.
+        conf = SmartLinkConf(Movie.objects.only('title'),
+                             searched_fields=('title',))
+        m = conf.find_object("Mad Max")
+        self.assertEqual(m, self.m)
+        self.assertNotIn('slug', m.__dict__)
+
+        # Objects which left the queryset are not linked to.
+        conf = SmartLinkConf(Movie.objects.exclude(pk=self.m.pk),
+                             searched_fields=('title',))
+        self.assertRaises(IndexEntry.DoesNotExist, conf.find_object,
+                          "Mad Max")
+
     def testUpdateIndexForObject(self):
         # Dirty Harry 1971 would have:
         expected_entries = (
@@ -258,6 +430,102 @@ class ConfTest(TestCase):
             [i.value for i in indexed_entries()]
         )
 
+    def testUpdateIndexForObjectWritesDifference(self):
+        writes = lambda queries: [
+            q['sql'] for q in queries.captured_queries
+            if 'INSERT INTO' in q['sql'].upper()
+            or 'DELETE FROM' in q['sql'].upper()]
+
+        # Nothing changed, nothing written.
+        with CaptureQueriesContext(connection) as queries:
+            self.movie_conf.update_index_for_object(Movie, self.m,
+                                                    created=False)
+        self.assertEqual(writes(queries), [])
+
+        # Only the entries which changed are written.
+        self.m.slug = "mad-max-2"
+        with CaptureQueriesContext(connection) as queries:
+            self.movie_conf.update_index_for_object(Movie, self.m,
+                                                    created=False)
+        self.assertEqual(len(writes(queries)), 1)
+        self.assertItemsEqual(
+            IndexEntry.objects.filter(object_id=self.m.pk).values_list(
+                'value', flat=True),
+            [u'madmax', u'madmax2', u'madmax1984', u'madmaxreleasedin1984',
+             unicode(self.m.pk)]
+        )
+
+        # Entries no longer valid are removed.
+        self.m.title = "Mad Max 2"
+        with CaptureQueriesContext(connection) as queries:
+            self.movie_conf.update_index_for_object(Movie, self.m,
+                                                    created=False)
+        self.assertEqual(len(writes(queries)), 2)
+        self.assertItemsEqual(
+            IndexEntry.objects.filter(object_id=self.m.pk).values_list(
+                'value', flat=True),
+            [u'madmax2', u'madmax21984', u'madmax2releasedin1984',
+             unicode(self.m.pk)]
+        )
+
+    def testUpdateIndexForObjectConflicts(self):
+        amelie = Movie.objects.create(title="Amelie", slug="amelie",
+                                      year=2001)
+
+        # Concurrent save has already inserted one of the entries.
+        IndexEntry.objects.create(
+            value=u'amelie',
+            content_type=ContentType.objects.get_for_model(Movie),
+            object_id=amelie.pk
+        )
+        self.movie_conf.update_index_for_object(Movie, amelie, created=True)
+
+        self.assertItemsEqual(
+            IndexEntry.objects.filter(object_id=amelie.pk).values_list(
+                'value', flat=True),
+            [u'amelie', u'amelie2001', u'ameliereleasedin2001',
+             unicode(amelie.pk)]
+        )
+
+    def testRecreateIndex(self):
+        entries = lambda: sorted(IndexEntry.objects.values_list(
+            'value', 'object_id'))
+        expected = entries()
+        IndexEntry.objects.all().delete()
+
+        # Chunks smaller then the number of instances.
+        self.movie_conf.index_chunk_size = 2
+        self.assertEqual(self.movie_conf.recreate_index(), len(expected))
+        self.assertEqual(entries(), expected)
+
+    def testRecreateIndexMemory(self):
+        for i in range(30):
+            Movie.objects.create(title="Movie %s" % i, slug="movie", year=2000)
+        IndexEntry.objects.all().delete()
+
+        # Number of instances fetched by each query.
+        fetched = []
+        iter_chunks = self.movie_conf.iter_chunks
+        def counting_iter_chunks(chunk_size=None):
+            for chunk in iter_chunks(chunk_size):
+                fetched.append(len(chunk))
+                yield chunk
+        self.movie_conf.iter_chunks = counting_iter_chunks
+
+        with CaptureQueriesContext(connection) as queries:
+            self.movie_conf.recreate_index(chunk_size=5)
+
+        # The 33 public movies, at most 5 at a time.
+        self.assertEqual(fetched, [5] * 6 + [3])
+
+        # Every SELECT of the movies is a bounded one.
+        selects = [q['sql'] for q in queries.captured_queries
+                   if 'SELECT' in q['sql'].upper()
+                   and 'smartlinks_movie' in q['sql']]
+        self.assertEqual(len(selects), 7)
+        for sql in selects:
+            self.assertIn('LIMIT 5', sql)
+
     def testDotNotationInSearchedFields(self):
         dot_conf = SmartLinkConf(
             Teacher.objects,
@@ -305,3 +573,140 @@ class ConfTest(TestCase):
             self.movie_conf.find_object('Amelie'),
             m
         )
+
+
+class IndexDependenciesTest(TestCase):
+    def setUp(self):
+        self.conf = SmartLinkConf(Person.objects,
+                                  searched_fields=('name', 'pk'))
+        self.conf._dependencies = self.conf.get_index_dependencies()
+
+        # What ``register_smart_link`` does, without the global registration.
+        self.receivers = (
+            (signals.post_save, self.conf.update_index_for_object),
+            (signals.post_delete, self.conf.update_index_for_object),
+            (signals.post_init, self.conf.snapshot_instance),
+        )
+        for signal, receiver in self.receivers:
+            signal.connect(receiver, sender=Person)
+
+    def tearDown(self):
+        for signal, receiver in self.receivers:
+            signal.disconnect(receiver, sender=Person)
+        IndexEntry.objects.all().delete()
+
+    def testGetIndexDependencies(self):
+        self.assertEqual(self.conf.get_index_dependencies(),
+                         set(['name', 'id']))
+
+        # Nor the dot-notation lookups, the related object might have
+        # changed.
+        self.assertEqual(
+            SmartLinkConf(Teacher.objects, searched_fields=(
+                ('position', 'person.name'),)).get_index_dependencies(),
+            None
+        )
+
+        # Methods can't be worked out.
+        self.assertEqual(
+            SmartLinkConf(Movie2.objects, searched_fields=(
+                'title', '__unicode__')).get_index_dependencies(),
+            None
+        )
+
+        # Neither can the filtered querysets.
+        self.assertEqual(
+            SmartLinkConf(Movie.objects, searched_fields=(
+                'title',)).get_index_dependencies(),
+            None
+        )
+
+        # Unless specified explicitly.
+        self.assertEqual(
+            SmartLinkConf(Movie.objects, searched_fields=('__unicode__',),
+                index_dependencies=('title', 'year', 'public'),
+            ).get_index_dependencies(),
+            set(['title', 'year', 'public'])
+        )
+
+    def testSkipUnchanged(self):
+        values = lambda person: set(IndexEntry.objects.filter(
+            object_id=person.pk,
+            content_type=ContentType.objects.get_for_model(Person)
+        ).values_list('value', flat=True))
+
+        p = Person.objects.create(name='Mark')
+        self.assertEqual(values(p), set([u'mark', unicode(p.pk)]))
+        self.assertEqual(self.conf.reindexes_performed, 1)
+
+        with self.assertNumQueries(1):
+            p.save()
+        self.assertEqual(self.conf.reindexes_skipped, 1)
+
+        p.name = 'Marc'
+        p.save()
+        self.assertEqual(values(p), set([u'marc', unicode(p.pk)]))
+        self.assertEqual(self.conf.reindexes_performed, 2)
+
+        # Snapshot is taken when the instance is loaded.
+        p = Person.objects.get(pk=p.pk)
+        p.save()
+        self.assertEqual(self.conf.reindexes_skipped, 2)
+
+        # Fields saved are known.
+        p.name = 'Mark'
+        p.save(update_fields=['name'])
+        self.assertEqual(self.conf.reindexes_performed, 3)
+        self.assertEqual(values(p), set([u'mark', unicode(p.pk)]))
+
+    def testDotNotationAlwaysReindexed(self):
+        conf = SmartLinkConf(Teacher.objects,
+                             searched_fields=(('position', 'person.name'),))
+        conf._dependencies = conf.get_index_dependencies()
+        self.assertEqual(conf._dependencies, None)
+        signals.post_save.connect(conf.update_index_for_object,
+                                  sender=Teacher)
+        try:
+            person = Person.objects.create(name='Mark')
+            teacher = Teacher.objects.create(position='Professor',
+                                             person=person)
+
+            # Renaming the person leaves the teacher's fields unchanged.
+            person.name = 'Marc'
+            person.save()
+            Teacher.objects.get(pk=teacher.pk).save()
+            self.assertEqual(conf.reindexes_skipped, 0)
+            self.assertEqual(set(IndexEntry.objects.filter(
+                object_id=teacher.pk,
+                content_type=ContentType.objects.get_for_model(Teacher)
+            ).values_list('value', flat=True)), set([u'professormarc']))
+        finally:
+            signals.post_save.disconnect(conf.update_index_for_object,
+                                         sender=Teacher)
+
+    def testUpdateFieldsSnapshot(self):
+        conf = SmartLinkConf(Movie2.objects, searched_fields=('title',))
+        conf._dependencies = conf.get_index_dependencies()
+        receivers = (
+            (signals.post_save, conf.update_index_for_object),
+            (signals.post_init, conf.snapshot_instance),
+        )
+        for signal, receiver in receivers:
+            signal.connect(receiver, sender=Movie2)
+        try:
+            movie = Movie2.objects.create(title="Mad Max", slug="mad-max",
+                                          year=1979)
+
+            # The title edited but not saved yet is not remembered as saved.
+            movie.title = "Mad Max 2"
+            movie.year = 1981
+            movie.save(update_fields=['year'])
+            self.assertEqual(conf.reindexes_skipped, 1)
+            movie.save()
+            self.assertEqual(set(IndexEntry.objects.filter(
+                object_id=movie.pk,
+                content_type=ContentType.objects.get_for_model(Movie2)
+            ).values_list('value', flat=True)), set([u'madmax2']))
+        finally:
+            for signal, receiver in receivers:
+                signal.disconnect(receiver, sender=Movie2)
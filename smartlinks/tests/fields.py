@@ -1,11 +1,13 @@
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.template.base import Template
 from django.template.context import Context
 from django import forms
 
 from smartlinks import register_smart_link
-from smartlinks.fields import SmartLinkFormField
+from smartlinks.fields import SmartLinkFormField, prefetch_smartlinks
 from smartlinks.conf import SmartLinkConf
 from smartlinks.templatetags.smartlinks import smartlinks
 import smartlinks.conf as conf
@@ -148,6 +150,62 @@ class SmartLinkFieldTest(TestCase):
             smartlinks(self.l.link.raw)
         )
 
+    def testMemoised(self):
+        self.m = Movie2.objects.create(
+            title='My Movie2',
+            slug='my-awesome-Movie2',
+            year=2001
+        )
+
+        l = LinkModel.objects.get(pk=LinkModel.objects.create(
+            link=u"[[ zzz->my Movie2 ]]").pk)
+        self.assertIs(l.link, l.link)
+
+        rendered = smartlinks(l.link.raw, 'nocache')
+        self.assertEqual(l.link.url, self.m.get_absolute_url())
+        with self.assertNumQueries(0):
+            self.assertEqual(l.link.object, self.m)
+            self.assertEqual(l.link.url, self.m.get_absolute_url())
+            self.assertEqual(l.link.rendered_link, rendered)
+            self.assertEqual(l.link.verbose_text, u"my Movie2")
+
+        # Setting the raw smartlink forgets the outcomes, also for the
+        # wrapper already handed out.
+        link = l.link
+        l.link = u"[[ zzz->no such movie ]]"
+        self.assertEqual(link.url, u"")
+        self.assertEqual(l.link.object, None)
+        self.assertEqual(l.link.verbose_text, u"no such movie")
+
+        link.raw = u"[[ zzz->my Movie2 | mine ]]"
+        self.assertEqual(l.link.object, self.m)
+        self.assertEqual(l.link.verbose_text, u"mine")
+
+    def testPrefetchSmartlinks(self):
+        movies = [Movie2.objects.create(title='Movie %s' % i,
+                                        slug='movie-%s' % i, year=2001)
+                  for i in range(6)]
+        for movie in movies[:3]:
+            LinkModel.objects.create(link=u"[[ zzz->%s ]]" % movie.title)
+        LinkModel.objects.create(link=u"[[ no such movie ]]")
+        LinkModel.objects.create(link=u"")
+
+        with CaptureQueriesContext(connection) as few:
+            links = prefetch_smartlinks(LinkModel.objects.all(), 'link')
+        with self.assertNumQueries(0):
+            self.assertEqual([l.link.object for l in links],
+                             movies[:3] + [None, None])
+            self.assertEqual([l.link.url for l in links[:2]],
+                             [m.get_absolute_url() for m in movies[:2]])
+            links[0].link.rendered_link
+
+        # Number of queries does not depend on the number of smartlinks.
+        for movie in movies[3:]:
+            LinkModel.objects.create(link=u"[[ %s ]]" % movie.title)
+        with CaptureQueriesContext(connection) as many:
+            prefetch_smartlinks(LinkModel.objects.all(), 'link')
+        self.assertLessEqual(len(many), len(few) + 1)
+
     def testLen(self):
         self.m = Movie2.objects.create(
             title='My Movie2',
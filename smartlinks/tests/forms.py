@@ -0,0 +1,79 @@
+from django import forms
+from django.db import connection
+from django.forms.formsets import formset_factory, BaseFormSet
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from smartlinks import register_smart_link
+from smartlinks.conf import SmartLinkConf
+from smartlinks.fields import SmartLinkFormField
+from smartlinks.forms import SmartLinkFormSet, SmartLinkFormMixin
+
+from .budgets import isolate_registry, restore_registry
+from .models import Movie2
+
+
+class LinkForm(forms.Form):
+    link = SmartLinkFormField(verify_exists=True)
+
+
+class TwoLinksForm(SmartLinkFormMixin, forms.Form):
+    link = SmartLinkFormField(verify_exists=True)
+    other_link = SmartLinkFormField(verify_exists=True)
+
+
+class VerifiedInBulkTest(TestCase):
+    def setUp(self):
+        # Only the configuration of the test is registered.
+        self.registered = isolate_registry()
+
+        self.conf = SmartLinkConf(queryset=Movie2.objects,
+                                  searched_fields=('title', 'slug',))
+        register_smart_link(('zzz',), self.conf)
+        for i in range(5):
+            Movie2.objects.create(title='Movie %s' % i, slug='movie-%s' % i,
+                                  year=2001)
+
+    def tearDown(self):
+        restore_registry(self.registered)
+
+    def formset_data(self, links):
+        data = {
+            'form-TOTAL_FORMS': str(len(links)),
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+        }
+        for i, link in enumerate(links):
+            data['form-%s-link' % i] = link
+        return data
+
+    def validate(self, formset_class, links):
+        formset = formset_factory(LinkForm, formset=formset_class)(
+            self.formset_data(links))
+        with CaptureQueriesContext(connection) as queries:
+            formset.is_valid()
+        return [form.errors.keys() for form in formset.forms], len(queries)
+
+    def testFormSet(self):
+        links = ['zzz->Movie %s' % i for i in range(5)] + [
+            'zzz->no such movie', 'Movie 1', 'Movie', '[[ not a link']
+
+        errors, queries = self.validate(SmartLinkFormSet, links)
+        self.assertEqual(errors, [[]] * 5 + [['link'], [], ['link'],
+                                             ['link']])
+
+        # Same errors as when verified one by one, with fewer queries.
+        one_by_one_errors, one_by_one_queries = self.validate(BaseFormSet,
+                                                              links)
+        self.assertEqual(errors, one_by_one_errors)
+        self.assertLess(queries, one_by_one_queries)
+
+        # The number of queries does not depend on the number of forms.
+        errors, more_queries = self.validate(SmartLinkFormSet, links * 3)
+        self.assertEqual(more_queries, queries)
+
+    def testForm(self):
+        form = TwoLinksForm({'link': 'Movie 1', 'other_link': 'Amelie'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.keys(), ['other_link'])
@@ -1,3 +1,5 @@
+from django.utils.six import StringIO
+
 from django.test import TestCase
 from django.contrib.contenttypes.models import ContentType
 from django.core.management import call_command
@@ -6,9 +8,17 @@ from smartlinks.models import IndexEntry
 from smartlinks.conf import SmartLinkConf
 from smartlinks import register_smart_link
 
+from smartlinks.tests.budgets import isolate_registry, restore_registry
 from smartlinks.tests.models import Movie
 
 class IndexResetTest(TestCase):
+    def setUp(self):
+        # Only the configurations of the test are reindexed.
+        self.registered = isolate_registry()
+
+    def tearDown(self):
+        restore_registry(self.registered)
+
     def testIndexRecreation(self):
         register_smart_link(('m', 'movie'), SmartLinkConf(
             Movie.objects,
@@ -44,7 +54,9 @@ class IndexResetTest(TestCase):
         )
 
         # ...and see whether it can re-create itself properly.
-        call_command('reset_smartlink_index')
+        out = StringIO()
+        call_command('reset_smartlink_index', stdout=out)
+        self.assertIn('rows/s', out.getvalue())
 
         self.assertEqual(IndexEntry.objects.count(),
             2)
@@ -57,3 +69,40 @@ class IndexResetTest(TestCase):
         self.assertEqual(IndexEntry.objects.filter(object_id=self.m2.pk).count(),
          1)
 
+
+
+    def testParallelIndexRecreation(self):
+        register_smart_link(('pm',), SmartLinkConf(
+            Movie.objects,
+            searched_fields=('title', 'slug', ('title', 'year'))
+            )
+        )
+        for i in range(25):
+            Movie.objects.create(title="Movie %s" % i, slug="movie-%s" % i,
+                                 year=2000 + i)
+
+        entries = lambda: sorted(IndexEntry.objects.values_list(
+            'value', 'content_type', 'object_id'))
+
+        call_command('reset_smartlink_index', verbosity=0)
+        expected = entries()
+
+        # Same index, computed by two processes, in ranges of 4 objects.
+        call_command('reset_smartlink_index', workers=2, chunk_size=4,
+                     verbosity=0)
+        self.assertEqual(entries(), expected)
+
+    def testInMemoryDatabase(self):
+        from smartlinks.management.commands.reset_smartlink_index import \
+            _is_in_memory
+
+        connection = lambda vendor, name: type("Connection", (object,), dict(
+            vendor=vendor, settings_dict={'NAME': name}))()
+
+        # Only an in-memory SQLite database keeps its connection across
+        # the fork of the workers.
+        self.assertTrue(_is_in_memory(connection('sqlite', ':memory:')))
+        self.assertTrue(_is_in_memory(connection(
+            'sqlite', 'file:memorydb_default?mode=memory&cache=shared')))
+        self.assertFalse(_is_in_memory(connection('sqlite', '/tmp/db.sqlite')))
+        self.assertFalse(_is_in_memory(connection('postgresql', 'smartlinks')))
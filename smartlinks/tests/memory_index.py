@@ -0,0 +1,90 @@
+from django.test import TestCase
+
+from smartlinks.conf import SmartLinkConf
+from smartlinks.memory_index import MemoryIndex
+from smartlinks.models import IndexEntry
+
+from smartlinks.tests.models import Movie2
+
+
+class MemoryIndexTest(TestCase):
+    def setUp(self):
+        self.index = MemoryIndex([
+            (u"madmax", 1),
+            (u"madmax1984", 1),
+            (u"dirtyharry", 2),
+            (u"dirtyharry", 3),
+            (u"dirtyharry1971", 2),
+        ])
+
+    def testFind(self):
+        self.assertEqual(self.index.find(u"madmax"), (1,))
+        self.assertEqual(self.index.find(u"dirtyharry"), (2, 3))
+
+        # Two entries of the same object are still ambiguous, as in the
+        # IndexEntry table.
+        self.assertEqual(self.index.find(u"mad"), (1, 1))
+        self.assertEqual(self.index.find(u"dirtyharry19"), (2,))
+        self.assertEqual(self.index.find(u"amelie"), ())
+
+    def testUpdate(self):
+        self.index.set_object(3, [u"amelie"])
+        self.assertEqual(self.index.find(u"dirtyharry"), (2,))
+        self.assertEqual(self.index.find(u"ame"), (3,))
+
+        self.index.remove_object(1)
+        self.assertEqual(self.index.find(u"mad"), ())
+        self.assertEqual(len(self.index), 3)
+
+
+class MemoryIndexConfTest(TestCase):
+    def setUp(self):
+        self.conf = SmartLinkConf(Movie2.objects, searched_fields=('title',),
+                                  memory_index=True)
+        self.m = Movie2.objects.create(title="Mad Max", slug="mad-max",
+                                       year=1984)
+        self.conf.update_index_for_object(Movie2, self.m, created=True)
+
+    def tearDown(self):
+        IndexEntry.objects.all().delete()
+
+    def testFindObject(self):
+        self.assertEqual(self.conf.find_object("Mad Max"), self.m)
+
+        # Only the object itself is fetched once the index is loaded.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.conf.find_object("mad"), self.m)
+        with self.assertNumQueries(0):
+            self.assertRaises(IndexEntry.DoesNotExist,
+                              self.conf.find_object, "Amelie")
+
+    def testUpdatedOnSave(self):
+        self.conf.find_object("Mad Max")
+
+        amelie = Movie2.objects.create(title="Amelie", slug="amelie",
+                                       year=2001)
+        self.conf.update_index_for_object(Movie2, amelie, created=True)
+        self.assertEqual(self.conf.find_object("Amelie"), amelie)
+
+        amelie.title = "Mad Maxine"
+        amelie.save()
+        self.conf.update_index_for_object(Movie2, amelie, created=False)
+        self.assertRaises(IndexEntry.DoesNotExist,
+                          self.conf.find_object, "Amelie")
+        self.assertRaises(IndexEntry.MultipleObjectsReturned,
+                          self.conf.find_object, "Mad")
+
+        self.conf.update_index_for_object(Movie2, amelie, created='deleteme')
+        self.assertEqual(self.conf.find_object("Mad"), self.m)
+
+    def testReloadedOnRecreate(self):
+        self.conf.find_object("Mad Max")
+
+        # Bypasses the signals, the loaded index does not know about it.
+        Movie2.objects.filter(pk=self.m.pk).update(title="Amelie")
+        self.assertRaises(IndexEntry.DoesNotExist,
+                          self.conf.find_object, "Amelie")
+
+        IndexEntry.objects.all().delete()
+        self.conf.recreate_index()
+        self.assertEqual(self.conf.find_object("Amelie").pk, self.m.pk)
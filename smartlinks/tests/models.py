@@ -1,13 +1,13 @@
 from django.db import models
 from django.utils.safestring import SafeString
 
-from smartlinks.fields import SmartLinkField
+from smartlinks.fields import SmartLinkField, RenderedSmartTextField
 
 #: Test models for tests.
 
 class PublicMoviesManager(models.Manager):
-    def get_query_set(self):
-        return super(PublicMoviesManager, self).get_query_set().filter(
+    def get_queryset(self):
+        return super(PublicMoviesManager, self).get_queryset().filter(
             public=True
         )
 
@@ -60,3 +60,12 @@ class Movie2(models.Model):
 
     def get_absolute_url(self):
         return u"/movies/%s/" % self.slug
+
+class Page(models.Model):
+    """
+    Page with smartlinks in its text.
+    """
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    body_html = RenderedSmartTextField(source='body')
+    link = SmartLinkField(max_length=200, blank=True)
@@ -1,13 +1,17 @@
 import re
+from collections import OrderedDict as SortedDict
 
-from django.utils.safestring import SafeString
+from django.utils.safestring import SafeData, SafeString
 from django.test import TestCase
 from django.template.context import Context
 
-from smartlinks.parser import SmartLinkParser, SmartEmbedParser, Parser, NoSmartLinkConfFoundException
+from smartlinks.parser import SmartLinkParser, SmartEmbedParser, Parser, NoSmartLinkConfFoundException,\
+    SmartTextParser
 from smartlinks.conf import SmartLinkConf
 from smartlinks.models import IndexEntry
 
+from smartlinks.tests.models import Movie, Movie2
+
 
 class MySmartLinkConf(SmartLinkConf):
     def __init__(self):
@@ -254,6 +258,95 @@ class SmartLinkParserTest(TestCase):
             )
         )
 
+class BatchParserTest(TestCase):
+    def setUp(self):
+        self.conf = MySmartLinkConf()
+        self.smartlinks_conf = dict(m=self.conf, movie=self.conf)
+
+    def testSameOutput(self):
+        text = (
+            "[[ Mad Max ]], [[ m->no such object | gone ]], "
+            "[[ movie->more then one ]], [[ photo->Mad Max ]], "
+            "[[ Mad Max | again ]] and \\[[ escaped ]]."
+        )
+        self.assertEqual(
+            SmartLinkParser(self.smartlinks_conf,
+                            batch=True).process_smartlinks(text),
+            SmartLinkParser(self.smartlinks_conf).process_smartlinks(text)
+        )
+
+    def testOneLookupPerConf(self):
+        calls = []
+        find_objects = self.conf.find_objects
+        self.conf.find_objects = lambda queries: (
+            calls.append(set(queries)) or find_objects(queries))
+
+        SmartLinkParser(self.smartlinks_conf, batch=True).process_smartlinks(
+            "[[ m->a ]] [[ movie->b ]] [[ m->a | again ]]")
+
+        self.assertEqual(calls, [set(["a", "b"])])
+
+    def testQueryCountIndependentOfLinks(self):
+        conf = SmartLinkConf(Movie.objects, searched_fields=('title',))
+        for i in range(20):
+            conf.update_index_for_object(Movie, Movie.objects.create(
+                title="Movie %s" % i, slug="movie-%s" % i, year=2000),
+                created=True)
+
+        parser = SmartLinkParser(dict(m=conf), batch=True)
+        text = " ".join("[[ Movie %s ]] [[ m->Movie %s ]]" % (i, i)
+                        for i in range(20))
+        text += " [[ no such movie ]]"
+
+        # Exact lookup, prefix lookup and fetching objects, for both
+        # typed and untyped smartlinks.
+        with self.assertNumQueries(5):
+            out = parser.process_smartlinks(text)
+
+        self.assertEqual(
+            out,
+            SmartLinkParser(dict(m=conf)).process_smartlinks(text)
+        )
+
+    def testUntypedAcrossConfs(self):
+        movies = SmartLinkConf(Movie.objects, searched_fields=('title',))
+        movies2 = SmartLinkConf(Movie2.objects, searched_fields=('title',))
+        mad_max = Movie.objects.create(title="Mad Max Beyond Thunderdome",
+                                       slug="mad-max", year=1985)
+        mad_max2 = Movie2.objects.create(title="Mad Max", slug="mad-max",
+                                         year=1979)
+        amelie = Movie2.objects.create(title="Amelie", slug="amelie",
+                                       year=2001)
+        for conf, instance in ((movies, mad_max), (movies2, mad_max2),
+                               (movies2, amelie)):
+            conf.update_index_for_object(type(instance), instance,
+                                         created=True)
+
+        smartlinks_conf = SortedDict([('m', movies), ('movie', movies),
+                                      ('m2', movies2)])
+        parser = SmartLinkParser(smartlinks_conf)
+
+        # A prefix match in the first configuration wins over an exact one
+        # in the later.
+        self.assertEqual(parser._find_object(SmartLinkParser.finder.match(
+            "[[ Mad Max ]]")), mad_max)
+        self.assertEqual(parser.conf, movies)
+
+        # Exact and prefix lookups across all the configurations, then one
+        # query per configuration with objects found.
+        parser = SmartLinkParser(smartlinks_conf, batch=True)
+        with self.assertNumQueries(4):
+            parser.process_smartlinks(
+                "[[ Mad Max ]] [[ Amelie ]] [[ no such movie ]]")
+
+        parser = SmartLinkParser(smartlinks_conf)
+        self.assertEqual(parser._find_object(SmartLinkParser.finder.match(
+            "[[ Amelie ]]")), amelie)
+        self.assertEqual(parser.conf, movies2)
+        self.assertRaises(IndexEntry.DoesNotExist, parser._find_object,
+                          SmartLinkParser.finder.match("[[ no such movie ]]"))
+        self.assertEqual(parser.conf, movies2)
+
 class SmartEmbedParserTest(TestCase):
     def setUp(self):
         self.p = SmartLinkParser({
@@ -353,4 +446,90 @@ class SmartEmbedParserTest(TestCase):
             TestEmbedSmartLinkConf.disallowed_embed_template.render(Context({
                 'smartlink_text': smartlink_text
             }))
-        )
\ No newline at end of file
+        )
+
+
+class SmartTextParserTest(TestCase):
+    def setUp(self):
+        class EmbedConf(MySmartLinkConf):
+            embeddable_attributes = ("upper",)
+
+        self.conf = EmbedConf()
+        self.smartlinks_conf = dict(m=self.conf, movie=self.conf)
+
+    def twoPasses(self, text):
+        for parser in (SmartLinkParser, SmartEmbedParser):
+            text = parser(self.smartlinks_conf).process_smartlinks(text)
+        return text
+
+    def testSameOutput(self):
+        text = (
+            "[[ Mad Max ]], {{ m->Mad Max | upper }}, [[[ no such object ]], "
+            "{{ more then one | upper }}, {{ Mad Max | lower }}, "
+            "\\[[ escaped ]], \\{{ escaped | upper }} and {{ not an embed }}"
+        )
+        for batch in (False, True):
+            self.assertEqual(
+                SmartTextParser(self.smartlinks_conf,
+                                batch=batch).process_smartlinks(text),
+                self.twoPasses(text)
+            )
+
+    def testTokenize(self):
+        parser = SmartTextParser(self.smartlinks_conf)
+        tokens = list(parser.tokenize("[[ a ]] {{ b | upper }} [[ c ]]"))
+        self.assertEqual(
+            [(p, m.group("Query").strip()) for p, m in tokens],
+            [(parser.link_parser, "a"), (parser.embed_parser, "b"),
+             (parser.link_parser, "c")]
+        )
+
+    def testNoSmartlinks(self):
+        parser = SmartTextParser(self.smartlinks_conf)
+        parser.tokenize = None
+        out = parser.process_smartlinks("no smartlinks [here] {or here}")
+        self.assertIsInstance(out, SafeString)
+        self.assertEqual(out, "no smartlinks [here] {or here}")
+
+    def testOutputNotScannedAgain(self):
+        self.conf.find_object = lambda query: "{{ %s | upper }}" % query
+        self.assertEqual(
+            SmartTextParser(self.smartlinks_conf).process_smartlinks(
+                "[[ a ]]"),
+            '<a href="" title="{{ a | upper }}">a</a>'
+        )
+
+    def testIterSmartlinks(self):
+        calls = []
+        find_objects = self.conf.find_objects
+        self.conf.find_objects = lambda queries: (
+            calls.append(set(queries)) or find_objects(queries))
+
+        text = u"start [[ m->a ]] {{ m->b | upper }} [[ m->c ]] [[ m->d ]] end"
+        parser = SmartTextParser(self.smartlinks_conf, batch=True)
+        chunks = parser.iter_smartlinks(text, window=2)
+
+        # Only the first window is resolved before the first chunks.
+        self.assertEqual(next(chunks), u"start ")
+        self.assertEqual(calls, [set(["a", "b"])])
+
+        chunks = [u"start "] + list(chunks)
+        self.assertEqual(calls, [set(["a", "b"]), set(["c", "d"])])
+        self.assertEqual(u"".join(chunks), parser.process_smartlinks(text))
+        self.assertEqual(chunks[-1], u" end")
+
+    def testProcessMany(self):
+        calls = []
+        find_objects = self.conf.find_objects
+        self.conf.find_objects = lambda queries: (
+            calls.append(set(queries)) or find_objects(queries))
+
+        texts = [u"[[ m->a ]] and {{ m->b | upper }}", u"no links",
+                 u"[[ m->c | see c ]]"]
+        parser = SmartTextParser(self.smartlinks_conf, batch=True)
+        rendered = parser.process_many(texts)
+        self.assertEqual(calls, [set(["a", "b", "c"])])
+
+        self.assertEqual(rendered,
+                         [parser.process_smartlinks(text) for text in texts])
+        self.assertIsInstance(rendered[1], SafeData)
@@ -0,0 +1,197 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.test import TestCase
+
+from smartlinks import register_link_source, references,\
+    IncorrectlyConfiguredSmartlinkException
+from smartlinks.conf import SmartLinkConf, smartlinks_conf
+from smartlinks.fields import RenderedSmartTextField
+from smartlinks.models import IndexEntry, LinkReference
+from smartlinks.references import link_sources, references_to,\
+    broken_references, references_matching, rerender_dependents
+
+from smartlinks.tests.models import Movie2, Page
+
+
+class ReferencesTest(TestCase):
+    def setUp(self):
+        self.conf = SmartLinkConf(Movie2.objects, searched_fields=('title',))
+        smartlinks_conf['m'] = self.conf
+        self.fields = link_sources[Page]
+        register_link_source(Page, ('body', 'link'))
+
+        self.m = Movie2.objects.create(title="Mad Max", slug="mad-max",
+                                       year=1984)
+        self.conf.update_index_for_object(Movie2, self.m, created=True)
+        self.movie_type = ContentType.objects.get_for_model(Movie2)
+
+    def tearDown(self):
+        register_link_source(Page, self.fields)
+        smartlinks_conf.pop('m')
+        IndexEntry.objects.all().delete()
+
+    def references(self, page):
+        return sorted(LinkReference.objects.filter(
+            source_object_id=page.pk
+        ).values_list('field', 'value', 'target_content_type',
+                      'target_object_id'))
+
+    def testRegisterLinkSource(self):
+        register_link_source(Page)
+        self.assertEqual(link_sources[Page], ('link',))
+
+        self.assertRaises(IncorrectlyConfiguredSmartlinkException,
+                          register_link_source, Page, ('body', 'blah'))
+
+    def testSave(self):
+        page = Page.objects.create(
+            title="Movies",
+            body="[[ Mad Max ]], [[ m->Amelie ]] and [[ Dirty Harry ]]",
+            link="[[ mad ]]"
+        )
+        self.assertEqual(self.references(page), [
+            ('body', 'amelie', self.movie_type.pk, None),
+            ('body', 'dirtyharry', None, None),
+            ('body', 'madmax', self.movie_type.pk, self.m.pk),
+            ('link', 'mad', self.movie_type.pk, self.m.pk),
+        ])
+
+    def testEdit(self):
+        page = Page.objects.create(title="Movies",
+                                   body="[[ Mad Max ]] and [[ Amelie ]]")
+        kept = LinkReference.objects.get(value='madmax')
+
+        page.body = "[[ Mad Max ]] and [[ Dirty Harry ]]"
+        page.save()
+        self.assertEqual(self.references(page), [
+            ('body', 'dirtyharry', None, None),
+            ('body', 'madmax', self.movie_type.pk, self.m.pk),
+        ])
+
+        # Only the difference is written.
+        self.assertEqual(LinkReference.objects.get(value='madmax').pk,
+                         kept.pk)
+
+        # Only the update itself when no field with smartlinks is saved.
+        with self.assertNumQueries(1):
+            page.save(update_fields=['title'])
+
+    def testDelete(self):
+        page = Page.objects.create(title="Movies", body="[[ Mad Max ]]")
+        page.delete()
+        self.assertFalse(LinkReference.objects.exists())
+
+    def testQueries(self):
+        page = Page.objects.create(title="Movies",
+                                   body="[[ Mad Max ]] and [[ Amelie ]]")
+        Page.objects.create(title="Other", body="no smartlinks")
+
+        self.assertEqual(
+            [(reference.source_object_id, reference.value)
+             for reference in references_to(self.m)],
+            [(page.pk, 'madmax')]
+        )
+        self.assertEqual(
+            [reference.value for reference in broken_references()],
+            ['amelie']
+        )
+
+        # Adding an object titled "Amelie Poulain" could resolve it.
+        self.assertEqual(
+            [reference.value for reference in references_matching(
+                ['ameliepoulain'])],
+            ['amelie']
+        )
+
+
+class RenderedSmartTextFieldTest(TestCase):
+    def setUp(self):
+        self.conf = SmartLinkConf(Movie2.objects, searched_fields=('title',))
+        smartlinks_conf['m'] = self.conf
+
+        self.m = Movie2.objects.create(title="Mad Max", slug="mad-max",
+                                       year=1984)
+        self.conf.update_index_for_object(Movie2, self.m, created=True)
+
+    def tearDown(self):
+        smartlinks_conf.pop('m')
+        IndexEntry.objects.all().delete()
+
+    def add_movie(self, title, slug):
+        movie = Movie2.objects.create(title=title, slug=slug, year=2001)
+        self.conf.update_index_for_object(Movie2, movie, created=True)
+        return movie
+
+    def testRegistered(self):
+        # When the models are imported, before the app registry is ready.
+        self.assertEqual(link_sources[Page], ('body',))
+
+        def define_model():
+            class BrokenPage(models.Model):
+                body_html = RenderedSmartTextField(source='no_such_field')
+
+        self.assertRaises(IncorrectlyConfiguredSmartlinkException,
+                          define_model)
+
+    def testRenderedOnSave(self):
+        page = Page.objects.create(title="Movies",
+                                   body="[[ Mad Max ]] and [[ Amelie ]]")
+        rendered = (
+            u'<a href="/movies/mad-max/" title="Mad Max released in 1984">'
+            u'Mad Max</a> and '
+            u'<span class="smartlinks-unresolved">Amelie</span>'
+        )
+        self.assertEqual(page.body_html, rendered)
+        self.assertEqual(Page.objects.get(pk=page.pk).body_html, rendered)
+
+        # Reading costs nothing.
+        page = Page.objects.get(pk=page.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(page.body_html, rendered)
+
+    def testRerenderedOnIndexChange(self):
+        page = Page.objects.create(title="Movies", body="[[ Amelie ]]")
+        other = Page.objects.create(title="Other", body="[[ Mad Max ]]")
+        untouched = Page.objects.get(pk=other.pk).body_html
+
+        self.add_movie("Amelie", "amelie")
+        self.assertIn(u'href="/movies/amelie/"',
+                      Page.objects.get(pk=page.pk).body_html)
+
+        # Pages whose smartlinks can not have changed are left alone.
+        self.assertEqual(Page.objects.get(pk=other.pk).body_html, untouched)
+
+        # As is the reverse index, for the next changes.
+        self.assertEqual(
+            [reference.source_object_id for reference in references_to(
+                Movie2.objects.get(slug="amelie"))],
+            [page.pk]
+        )
+
+    def testRerenderedOnAmbiguity(self):
+        page = Page.objects.create(title="Movies", body="[[ Mad ]]")
+        self.assertIn(u'href="/movies/mad-max/"', page.body_html)
+
+        self.add_movie("Mad Maxine", "mad-maxine")
+        self.assertIn(u'smartlinks-ambiguous',
+                      Page.objects.get(pk=page.pk).body_html)
+
+    def testRerenderedOnDelete(self):
+        page = Page.objects.create(title="Movies", body="[[ Mad Max ]]")
+        self.conf.update_index_for_object(Movie2, self.m, created='deleteme')
+        self.assertIn(u'smartlinks-unresolved',
+                      Page.objects.get(pk=page.pk).body_html)
+
+    def testRerenderedInChunks(self):
+        for i in range(5):
+            Page.objects.create(title="Movies", body="[[ Amelie ]]")
+        self.add_movie("Amelie", "amelie")
+        Page.objects.update(body_html=u"")
+
+        references.rerender_chunk_size = 2
+        try:
+            self.assertEqual(rerender_dependents([u"amelie"]), 5)
+        finally:
+            references.rerender_chunk_size = 100
+        for page in Page.objects.all():
+            self.assertIn(u'href="/movies/amelie/"', page.body_html)
@@ -0,0 +1,146 @@
+import random
+import re
+import time
+
+from django.test import SimpleTestCase
+
+from smartlinks.scanner import LinkFinder, EmbedFinder, scan
+
+# Regular expressions the finders used to be, defining the grammar.
+LINK_RE = re.compile(r"""
+    (?<![\\])
+    \[\[
+        \s*
+        ((?P<ModelName>\w+)\s*\->)?
+        (?P<Query>[^\]\|]+)
+        (\|(?P<VerboseText>[^\]]+))?
+        \s*
+    \]\]
+""", re.VERBOSE)
+
+EMBED_RE = re.compile(r"""
+    (?<![\\])
+    \{\{
+        \s*
+        ((?P<ModelName>\w+)\s*\->)?
+        (?P<Query>[^\]\|]+)
+        \|\s*(?P<AttrName>\w+)
+        (?P<Options>
+          (\s*\|\s*
+          ((\w+\s*=\s*\w+) | (\w+))
+          )+
+        )?
+        \s*
+    \}\}
+""", re.VERBOSE)
+
+# Pieces the random texts are made of.
+ALPHABET = list(u"[]{}|->= \\\nab_1") + [
+    u"[[", u"]]", u"{{", u"}}", u"->", u" | ", u"x=y"]
+
+
+def outcome(match):
+    if match is None:
+        return None
+    return match.span(), match.groupdict()
+
+
+class ScannerTest(SimpleTestCase):
+    def testSameAsRegexps(self):
+        rng = random.Random(0)
+        for regexp, finder in ((LINK_RE, LinkFinder()),
+                               (EMBED_RE, EmbedFinder())):
+            for i in range(3000):
+                text = u"".join(rng.choice(ALPHABET)
+                                for j in range(rng.randint(0, 30)))
+                self.assertEqual(
+                    [outcome(match) for match in finder.finditer(text)],
+                    [outcome(match) for match in regexp.finditer(text)],
+                    text
+                )
+                for pos in range(len(text)):
+                    self.assertEqual(outcome(finder.match(text, pos)),
+                                     outcome(regexp.match(text, pos)),
+                                     (text, pos))
+
+    def testGroups(self):
+        match = EmbedFinder().match(
+            u"{{ Event->Siesta | Image | size=300 | crop }}")
+        self.assertEqual(match.group(), match.group(0))
+        self.assertEqual(match.group("ModelName"), u"Event")
+        self.assertEqual(match.group("Query"), u"Siesta ")
+        self.assertEqual(match.group("AttrName"), u"Image")
+        self.assertEqual(match.group("Options"), u" | size=300 | crop")
+        self.assertEqual(match.groupdict()["Options"], u" | size=300 | crop")
+
+        match = LinkFinder().match(u"[[ Mad Max ]]")
+        self.assertEqual(match.group("ModelName"), None)
+        self.assertEqual(match.group("VerboseText"), None)
+        self.assertEqual(match.span(), (0, 13))
+
+    def testSub(self):
+        self.assertEqual(
+            LinkFinder().sub(lambda match: u"<%s>" % match.group("Query"),
+                             u"a [[b]] \\[[c]] [[[d]]"),
+            u"a <b> \\[[c]] <[d>"
+        )
+
+    def testScan(self):
+        link, embed = LinkFinder(), EmbedFinder()
+        self.assertEqual(
+            [(finder, match.group()) for finder, match in scan(
+                u"[[ a ]] {{ b | c }} [[ d {{ e | f }} ]]", (link, embed))],
+            [(link, u"[[ a ]]"), (embed, u"{{ b | c }}"),
+             (link, u"[[ d {{ e | f }} ]]")]
+        )
+
+
+class PathologicalInputTest(SimpleTestCase):
+    """
+    Malformed input the regular expressions backtracked on, which has to be
+    scanned in time proportional to its length.
+    """
+
+    # Length of the repeated pieces.
+    size = 20000
+
+    # Seconds allowed for scanning each text, far more then it takes but far
+    # less then any quadratic behaviour would.
+    time_limit = 2.0
+
+    def assertScannedQuickly(self, text):
+        start = time.time()
+        list(scan(text, (LinkFinder(), EmbedFinder())))
+        self.assertLess(time.time() - start, self.time_limit)
+
+    def testUnclosedOptions(self):
+        self.assertScannedQuickly(u"{{ a " + u"| aaa " * self.size)
+        self.assertScannedQuickly(u"{{ a | b" + u" | aaa = bbb" * self.size)
+        self.assertScannedQuickly(u"{{ a | b" + u" | aaa" * self.size + u" }")
+
+    def testManyOpenings(self):
+        self.assertScannedQuickly(u"[[" * self.size)
+        self.assertScannedQuickly(u"{{" * self.size)
+        self.assertScannedQuickly(u"\\[[" * self.size)
+        self.assertScannedQuickly(u"[" * self.size + u"|" + u"x" * self.size)
+
+    def testOpeningsSharingTheRest(self):
+        self.assertScannedQuickly(
+            u"{{ x " * self.size + u"| a" + u" | b" * self.size)
+        self.assertScannedQuickly(u"[[ a |" * self.size)
+        self.assertScannedQuickly(u"{{ [[ a | " * self.size)
+        self.assertScannedQuickly(u"[[ Model ->" * self.size)
+
+    def testGrowsLinearly(self):
+        text = u"{{ x | a" + u" | b = c" * self.size
+
+        start = time.time()
+        list(scan(text, (LinkFinder(), EmbedFinder())))
+        small = time.time() - start
+
+        start = time.time()
+        list(scan(text * 4, (LinkFinder(), EmbedFinder())))
+        large = time.time() - start
+
+        # Quadratic time would take 16 times longer, leave room for noise.
+        self.assertLess(large, small * 8 + 0.05)